@@ -0,0 +1,174 @@
+"""
+Async-варианты горячих эндпоинтов чтения для запуска под ASGI (uvicorn).
+
+Сводка, шахматка, свободные номера и списки гостей и бронирований
+читаются async ORM (aaggregate, acount, aiterator), независимые агрегаты
+выполняются через asyncio.gather. Ответы совпадают с синхронными
+представлениями DRF: используются те же функции reports.py, фильтры viewset'ов,
+курсорная пагинация и RowTransformer.
+
+Эндпоинты всегда доступны под /api/async/...; с ASYNC_READ_ENDPOINTS = True они
+обслуживают и основные пути /api/... (см. femida/urls.py). Запросы, которые
+async-путь не обрабатывает (запись, ?fields=/?expand=, кэшируемый список
+номеров), передаются синхронному представлению DRF в потоке.
+
+Здесь же поток изменений /api/events/ (Server-Sent Events, см. events.py).
+"""
+import asyncio
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+from rest_framework_simplejwt.settings import api_settings
+
+from . import events, response_cache
+from .authentication import TokenUserAuthentication, events_ticket_user_id
+from .fast_list import transformer
+from .renderers import ORJSONRenderer
+from .response_cache import CachedListMixin
+from .reports import ReportParamsError, adashboard_summary, aoccupancy_calendar, available_rooms
+from .serializers import RoomSerializer
+from .sparse import is_sparse
+from .views import BookingViewSet, GuestViewSet, RoomViewSet
+
+_renderer = ORJSONRenderer()
+_authentication = TokenUserAuthentication()
+
+
+def _json(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(_renderer.render(data), status=status_code, content_type='application/json')
+
+
+def _api_error(e):
+    detail = e.detail if isinstance(e.detail, (dict, list)) else {'detail': e.detail}
+    response = _json(detail, e.status_code)
+    if isinstance(e, exceptions.NotAuthenticated | exceptions.AuthenticationFailed):
+        response['WWW-Authenticate'] = _authentication.authenticate_header(None)
+    return response
+
+
+async def _authenticate(request, query_ticket):
+    authenticated = await _authentication.aauthenticate(request)
+    if authenticated is None and query_ticket and request.GET.get('ticket'):
+        # Билет содержит только id: сотрудник читается из БД с проверкой блокировки
+        claims = {api_settings.USER_ID_CLAIM: events_ticket_user_id(request.GET['ticket'])}
+        authenticated = await _authentication.aget_user(claims), None
+    if authenticated is None:
+        raise exceptions.NotAuthenticated()
+    return authenticated
+
+
+def async_endpoint(fallback=None, query_ticket=False):
+    """
+    Async-представление чтения с JWT-аутентификацией (TokenUserAuthentication).
+    Методы, кроме GET/HEAD, передаются синхронному fallback или получают 405.
+    query_ticket - вместо заголовка можно передать билет events_ticket() в ?ticket=
+    (EventSource не умеет задавать заголовки, а access-токен не должен попадать в URL и логи).
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                if fallback is not None:
+                    return await sync_to_async(fallback)(request, *args, **kwargs)
+                return _json({'detail': f'Метод "{request.method}" не разрешен.'}, status.HTTP_405_METHOD_NOT_ALLOWED)
+            try:
+                request.user, request.auth = await _authenticate(request, query_ticket)
+                return await view(request, *args, **kwargs)
+            except ReportParamsError as e:
+                return _json({'error': str(e)}, status.HTTP_400_BAD_REQUEST)
+            except exceptions.APIException as e:
+                return _api_error(e)
+        return csrf_exempt(wrapper)
+    return decorator
+
+
+@async_endpoint()
+async def dashboard_summary(request):
+    """Сводка для главной страницы"""
+    return _json(await adashboard_summary())
+
+
+@async_endpoint()
+async def calendar(request):
+    """Шахматка бронирований: ?from=&to=&building="""
+    return _json(await aoccupancy_calendar(request.GET))
+
+
+@async_endpoint()
+async def rooms_available(request):
+    """Свободные номера на период: check_in, check_out, people, building, room_class, ordering"""
+    rows = transformer(RoomSerializer)
+    rooms = available_rooms(request.GET).values(*rows.columns)
+    return _json(rows.transform_many([row async for row in rooms.aiterator()]))
+
+
+def async_list(viewset_class):
+    """
+    Список viewset'а через async ORM: те же фильтры, сортировка и курсорная пагинация,
+    что в FastListMixin.list(). Выборочные ответы (?fields=/?expand=) и запись - синхронный DRF.
+    Кэшируемые списки (CachedListMixin, например номера) при включённом кэше ответов
+    отдаёт синхронный viewset: кэш с ETag/304 обходится дешевле любого запроса к БД.
+    """
+    sync_view = viewset_class.as_view({'get': 'list', 'post': 'create'})
+
+    @async_endpoint(fallback=sync_view)
+    async def view(request):
+        drf_request = Request(request)
+        drf_request.user = request.user
+        cached = issubclass(viewset_class, CachedListMixin) and response_cache.enabled()
+        if is_sparse(drf_request) or not viewset_class.fast_list or cached:
+            return await sync_to_async(sync_view)(request)
+        viewset = viewset_class(request=drf_request, args=(), kwargs={}, format_kwarg=None, action='list')
+        viewset.check_permissions(drf_request)
+        queryset, rows = viewset.fast_queryset()
+        # Курсорная пагинация - синхронный код DRF, страница читается одним запросом в потоке
+        page = await sync_to_async(viewset.paginate_queryset)(queryset)
+        if page is not None:
+            return _json(viewset.get_paginated_response(rows.transform_many(page)).data)
+        return _json(rows.transform_many([row async for row in queryset.aiterator()]))
+
+    view.__name__ = view.__qualname__ = f'{viewset_class.__name__}_async_list'
+    return view
+
+
+rooms = async_list(RoomViewSet)
+guests = async_list(GuestViewSet)
+bookings = async_list(BookingViewSet)
+
+
+@async_endpoint(query_ticket=True)
+async def events_stream(request):
+    """
+    Server-Sent Events с изменениями бронирований и статусов номеров (booking/events.py).
+    Подключение: заголовок Authorization или ?ticket= (POST /api/events/ticket/).
+    Билет проверяется при подключении; для переподключения после его истечения
+    клиент получает новый билет.
+    Last-Event-ID (заголовок или ?last_event_id=) - продолжить с пропущенных событий.
+    Через EVENTS_STREAM_TIMEOUT секунд поток закрывается, браузер переподключается сам.
+    Под WSGI каждое подключение занимает поток сервера, поэтому там поток
+    доступен только с EVENTS_WSGI_STREAM = True (для runserver).
+    """
+    if not isinstance(request, ASGIRequest) and not getattr(settings, 'EVENTS_WSGI_STREAM', False):
+        return _json({'error': 'Поток событий доступен только при запуске под ASGI'}, status.HTTP_503_SERVICE_UNAVAILABLE)
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = 0  # чужой номер: клиент получит reset
+    # Под ASGI поток читается в event loop, под WSGI - в потоке сервера
+    loop = asyncio.get_running_loop() if isinstance(request, ASGIRequest) else None
+    subscription = await sync_to_async(events.get_broker().subscribe)(last_event_id, loop)
+    response = StreamingHttpResponse(
+        events.astream(subscription) if loop else events.stream(subscription),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    # nginx не должен буферизовать поток
+    response['X-Accel-Buffering'] = 'no'
+    return response
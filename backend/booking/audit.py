@@ -0,0 +1,102 @@
+"""
+Буферизованная запись журнала действий (AuditLog).
+
+Записи не вставляются по одной внутри save(): они копятся в буфере текущей
+транзакции и сохраняются одним bulk_create в transaction.on_commit. При откате
+транзакции (или точки сохранения) её записи отбрасываются вместе с изменениями.
+Вне транзакции записи копятся до конца запроса (AuditBufferMiddleware),
+а без middleware сохраняются сразу.
+
+Пачка пишется синхронно в колбэке on_commit (запись в памяти фонового потока
+терялась бы при падении процесса). Ошибка записи повторяется AUDIT_LOG_RETRIES
+раз; если запись так и не удалась, записи выводятся в лог целиком.
+"""
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+from asgiref.local import Local
+from django.conf import settings
+from django.db import DatabaseError, connection
+
+from . import commit_buffers
+
+logger = logging.getLogger(__name__)
+
+# asgiref Local: в async-запросе буфер виден и в потоке, где выполняется синхронный код
+_local = Local()
+
+
+def log(user, action, object_type, object_id, details):
+    """Добавляет запись в журнал; сохранение произойдёт после коммита"""
+    from .models import AuditLog
+
+    entry = AuditLog(
+        user_id=getattr(user, 'pk', user),
+        action=action,
+        object_type=object_type,
+        object_id=object_id,
+        details=details,
+    )
+    entries = commit_buffers.get('audit', _write)
+    if entries is not None:
+        entries.append(entry)
+    elif getattr(_local, 'request_entries', None) is not None:
+        _local.request_entries.append(entry)
+    else:
+        _write([entry])
+
+
+@contextmanager
+def request_buffer():
+    """Копит записи, сделанные вне транзакций, до конца запроса"""
+    if getattr(_local, 'request_entries', None) is not None:
+        yield
+        return
+    _local.request_entries = []
+    try:
+        yield
+    finally:
+        entries, _local.request_entries = _local.request_entries, None
+        _write(entries)
+
+
+def _write(entries):
+    """Сохраняет записи одним bulk_create; при ошибке повторяет попытку, а не отбрасывает их"""
+    if not entries:
+        return
+    attempts = getattr(settings, 'AUDIT_LOG_RETRIES', 3)
+    for attempt in range(1, attempts + 1):
+        try:
+            _bulk_create(entries)
+            return
+        except DatabaseError:
+            if attempt == attempts:
+                break
+            logger.warning(f"Не удалось записать {len(entries)} записей журнала, попытка {attempt}")
+            # Оборванное соединение будет открыто заново
+            connection.close_if_unusable_or_obsolete()
+            time.sleep(0.1 * attempt)
+    # Данные уже сохранены: записи остаются в логе, чтобы их можно было восстановить
+    logger.error(
+        f"Записи журнала не сохранены после {attempts} попыток: "
+        + json.dumps([_as_dict(entry) for entry in entries], ensure_ascii=False, default=str),
+        exc_info=True,
+    )
+
+
+def _as_dict(entry):
+    return {
+        'user_id': entry.user_id,
+        'action': entry.action,
+        'object_type': entry.object_type,
+        'object_id': entry.object_id,
+        'details': entry.details,
+    }
+
+
+def _bulk_create(entries):
+    from .models import AuditLog
+
+    AuditLog.objects.bulk_create(entries, batch_size=500)
@@ -0,0 +1,250 @@
+"""
+JWT-аутентификация без запроса пользователя к БД на каждый запрос.
+
+В токены, которые выдаёт CustomTokenObtainPairView, добавляются claims
+username, role и is_staff. TokenUserAuthentication строит по ним
+models.TokenUser - настоящий экземпляр User с отложенными остальными полями:
+права проверяются по claims, а полная запись загружается только при обращении
+к другому полю, одним запросом и через кэш на JWT_USER_CACHE_TTL секунд.
+
+Claims проверяются по снимку сотрудников в памяти процесса, общий кэш не нужен.
+Снимок хранит для каждого сотрудника is_active и claims_changed_at - время
+последней смены username, role, is_staff или is_active (его ставят и save(),
+и QuerySet.update(), см. models.UserQuerySet). Раз в JWT_USER_CHECK_INTERVAL
+секунд процесс сверяет версию (максимумы claims_changed_at и id, число сотрудников)
+одним запросом и перечитывает снимок, только если она изменилась. Блокировка,
+удаление и смена прав в другом процессе действуют не позже чем через
+JWT_USER_CHECK_INTERVAL секунд, в своём процессе - сразу. Токены, выданные до
+смены claims, и токены без claims обслуживаются запросом сотрудника из БД.
+
+Поток событий /api/events/ открывается не access-токеном в URL, а билетом
+events_ticket(): он подписан отдельной солью, годится только для потока и
+живёт EVENTS_TICKET_LIFETIME секунд.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db.models import Count, Max
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+# Поля пользователя, которые кладутся в токен
+CLAIMS = ('username', 'role', 'is_staff')
+# Поля, при смене которых claims выданных токенов перестают действовать
+REVOKING_FIELDS = {*CLAIMS, 'is_active'}
+
+USER_KEY_PREFIX = 'auth:user:'
+TICKET_SALT = 'booking.events.ticket'
+
+
+def _ttl():
+    return getattr(settings, 'JWT_USER_CACHE_TTL', 60)
+
+
+def _check_interval():
+    return getattr(settings, 'JWT_USER_CHECK_INTERVAL', 5)
+
+
+def claims_of(user):
+    return {claim: getattr(user, claim) for claim in CLAIMS}
+
+
+def add_claims(token, values):
+    for claim in CLAIMS:
+        token[claim] = values[claim]
+    return token
+
+
+def tokens_for(user):
+    """Refresh-токен с claims; access-токен (refresh.access_token) получает их копию"""
+    return add_claims(RefreshToken.for_user(user), claims_of(user))
+
+
+def _user_values(user_id):
+    from .models import User
+
+    fields = [field.attname for field in User._meta.concrete_fields if field.attname != 'password']
+    return User.objects.filter(pk=user_id).values(*fields)
+
+
+def cached_user_values(user_id):
+    """Поля пользователя (кроме пароля) из кэша или одним запросом; None - пользователя нет"""
+    key = f'{USER_KEY_PREFIX}{user_id}'
+    values = cache.get(key)
+    if values is None:
+        values = _user_values(user_id).first()
+        if values is None:
+            return None
+        cache.set(key, values, _ttl())
+    return values
+
+
+class _Snapshot:
+    """Снимок сотрудников процесса: id -> (is_active, claims_changed_at в секундах)"""
+
+    # Версия снимка: меняется при смене claims, создании и удалении сотрудника
+    VERSION = {'changed': Max('claims_changed_at'), 'last_id': Max('pk'), 'count': Count('pk')}
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.users = {}
+        self.checked = None
+
+    def expire(self):
+        self.checked = None
+
+    def _due(self):
+        return self.checked is None or time.monotonic() - self.checked >= _check_interval()
+
+    def _changed(self, version):
+        with self.lock:
+            self.checked = time.monotonic()
+            return version != self.version
+
+    def _store(self, version, rows):
+        # В токене id строкой (simplejwt), в билете событий - числом
+        users = {str(pk): (is_active, changed.timestamp() if changed else 0) for pk, is_active, changed in rows}
+        with self.lock:
+            self.version, self.users = version, users
+
+    def get(self, user_id):
+        from .models import User
+
+        if self._due():
+            version = User.objects.aggregate(**self.VERSION)
+            if self._changed(version):
+                self._store(version, User.objects.values_list('pk', 'is_active', 'claims_changed_at'))
+        return self.users.get(str(user_id))
+
+    async def aget(self, user_id):
+        """get() для async-представлений"""
+        from .models import User
+
+        if self._due():
+            version = await User.objects.aaggregate(**self.VERSION)
+            if self._changed(version):
+                rows = User.objects.values_list('pk', 'is_active', 'claims_changed_at')
+                self._store(version, [row async for row in rows])
+        return self.users.get(str(user_id))
+
+
+_snapshot = _Snapshot()
+
+
+def forget(user=None):
+    """
+    Сбрасывает кэш сотрудника user и заставляет процесс сверить снимок
+    при следующем запросе; другие процессы увидят изменения при своей сверке
+    """
+    if user is not None:
+        cache.delete(f'{USER_KEY_PREFIX}{user.pk}')
+    _snapshot.expire()
+
+
+def token_user(values):
+    """TokenUser с загруженными полями values (attname -> значение), остальные отложены"""
+    from .models import TokenUser
+
+    fields = [field.attname for field in TokenUser._meta.concrete_fields if field.attname in values]
+    return TokenUser.from_db(None, fields, [values[field] for field in fields])
+
+
+def events_ticket_lifetime():
+    return getattr(settings, 'EVENTS_TICKET_LIFETIME', 60)
+
+
+def events_ticket(user):
+    """Короткоживущий билет на подключение к потоку событий"""
+    return signing.dumps(user.pk, salt=TICKET_SALT)
+
+
+def events_ticket_user_id(ticket):
+    """id сотрудника из билета; просроченный или чужой билет - AuthenticationFailed"""
+    try:
+        return signing.loads(ticket, salt=TICKET_SALT, max_age=events_ticket_lifetime())
+    except signing.BadSignature:
+        raise AuthenticationFailed('Билет недействителен или истёк', code='ticket_invalid')
+
+
+class TokenUserAuthentication(JWTAuthentication):
+    """JWTAuthentication, который берёт пользователя из claims токена, а не из БД"""
+
+    def get_user(self, validated_token):
+        user_id = self._user_id(validated_token)
+        if self._claims_valid(validated_token, _snapshot.get(user_id)):
+            return self._claims_user(user_id, validated_token)
+        return self._checked_user(_user_values(user_id).first())
+
+    async def aget_user(self, validated_token):
+        """get_user() для async-представлений"""
+        user_id = self._user_id(validated_token)
+        if self._claims_valid(validated_token, await _snapshot.aget(user_id)):
+            return self._claims_user(user_id, validated_token)
+        return self._checked_user(await _user_values(user_id).afirst())
+
+    async def aauthenticate(self, request):
+        """authenticate() для async-представлений Django (без DRF Request): (user, token) или None"""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    @staticmethod
+    def _user_id(validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Токен не содержит идентификатор пользователя')
+
+    @staticmethod
+    def _claims_valid(validated_token, known):
+        """
+        Можно ли верить claims токена: сотрудник есть в снимке, не заблокирован
+        и claims не менялись после выдачи токена. Иначе сотрудник читается из БД
+        """
+        if known is None:
+            return False
+        is_active, changed = known
+        if not is_active:
+            raise AuthenticationFailed('Аккаунт заблокирован', code='user_inactive')
+        if not all(claim in validated_token for claim in CLAIMS):
+            return False
+        return validated_token.get('iat', 0) > changed
+
+    @staticmethod
+    def _claims_user(user_id, validated_token):
+        # Токен выдаётся только активному сотруднику, блокировка проверяется до вызова
+        values = {claim: validated_token[claim] for claim in CLAIMS}
+        return token_user({'id': user_id, 'is_active': True, **values})
+
+    @staticmethod
+    def _checked_user(values):
+        if values is None:
+            raise AuthenticationFailed('Пользователь не найден', code='user_not_found')
+        if not values['is_active']:
+            raise AuthenticationFailed('Аккаунт заблокирован', code='user_inactive')
+        return token_user(values)
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """Новый access-токен получает актуальные claims, а не копию из refresh-токена"""
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        access = AccessToken(data['access'])
+        # Из БД, а не из кэша: claims нового токена будут считаться актуальными
+        values = _user_values(access[api_settings.USER_ID_CLAIM]).first()
+        if values is not None:
+            data['access'] = str(add_claims(access, values))
+        return data
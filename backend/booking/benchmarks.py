@@ -0,0 +1,283 @@
+"""
+Набор замеров API, валидаторов и management-команд на демо-данных разного объёма.
+
+Для каждого масштаба данные создаются demo_data.generate() внутри транзакции,
+которая в конце откатывается; пишущие запросы дополнительно откатываются
+точкой сохранения после каждого повтора. Кэш на время замеров подменяется
+локальным, чтобы не трогать рабочий. Результат - список словарей с
+min/median/p95 в миллисекундах и числом SQL-запросов; report() собирает отчёт
+в JSON, compare() сравнивает его с отчётом прошлого релиза.
+"""
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+
+import django
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import demo_data, presence
+
+SCALES = {
+    'small': {'buildings': 2, 'rooms': 50, 'guests': 500, 'bookings': 2000},
+    'medium': {'buildings': 5, 'rooms': 500, 'guests': 20000, 'bookings': 100000},
+    'large': {'buildings': 10, 'rooms': 2000, 'guests': 200000, 'bookings': 1000000},
+}
+# Замер на данных, которые уже есть в базе (без генерации)
+EXISTING = 'existing'
+
+IMPORT_ROWS = 500
+
+# Режимы замера: чтение с пустым кэшем, чтение из прогретого кэша, запись с откатом
+READ, CACHED, WRITE = 'read', 'cached', 'write'
+
+
+class BenchmarkError(ValueError):
+    """Замеры невозможно провести (неизвестный масштаб, пустая база)"""
+
+
+def parse_scale(value):
+    """'small' | 'medium' | 'large' | 'existing' | 'корпуса:номера:гости:бронирования'"""
+    if value in SCALES:
+        return value, SCALES[value]
+    if value == EXISTING:
+        return value, None
+    parts = value.split(':')
+    if len(parts) == 4 and all(part.isdigit() for part in parts):
+        return value, dict(zip(('buildings', 'rooms', 'guests', 'bookings'), map(int, parts)))
+    raise BenchmarkError(
+        f"Неизвестный масштаб '{value}': {', '.join(SCALES)}, {EXISTING} или корпуса:номера:гости:бронирования"
+    )
+
+
+def percentile(values, percent):
+    """Значение перцентиля (ближайший ранг)"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(percent / 100 * (len(ordered) - 1)))]
+
+
+class Suite:
+    def __init__(self, repeat=5, seed=42, log=None):
+        self.repeat = max(1, repeat)
+        self.seed = seed
+        self.log = log or (lambda message: None)
+
+    def run(self, scale):
+        """Все замеры для одного масштаба; возвращает (объём данных, результаты)"""
+        from .models import Building, Room, Guest, Booking
+
+        name, params = parse_scale(scale)
+        test_cache = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark'}}
+        quiet = {'PERFORMANCE_SLOW_REQUEST_MS': float('inf'), 'PERFORMANCE_REPEATED_QUERIES': float('inf')}
+        # Замеры идут в одном процессе: кэш ответов работает, как с общим кэшем в production
+        with override_settings(CACHES=test_cache, RESPONSE_CACHE_PER_PROCESS=True, **quiet), transaction.atomic():
+            if params:
+                self.log(f'[{name}] генерация данных')
+                demo_data.generate(seed=self.seed, log=self.log, **params)
+            counts = {
+                'buildings': Building.objects.count(),
+                'rooms': Room.objects.count(),
+                'guests': Guest.objects.count(),
+                'bookings': Booking.objects.count(),
+            }
+            self.prepare()
+            results = []
+            try:
+                for group, case, method, path, func, mode in self.cases():
+                    self.log(f'[{name}] {group}: {case}')
+                    results.append({'scale': name, 'group': group, 'name': case, 'method': method, 'path': path,
+                                    **self.measure(func, mode)})
+            finally:
+                os.unlink(self.import_file)
+            transaction.set_rollback(True)
+        return counts, results
+
+    def prepare(self):
+        """Сотрудник для запросов и объекты, на которых проводятся замеры"""
+        from .models import User, Room, Guest, Booking
+
+        self.user = User.objects.create_user(username='benchmark', password=None, role='admin', is_staff=True)
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+        booking = Booking.objects.filter(is_deleted=False).order_by('-id').first()
+        guest = booking.guest if booking else Guest.objects.filter(is_deleted=False).order_by('-id').first()
+        if guest is None:
+            raise BenchmarkError('Для замеров нужны хотя бы один гость и один номер')
+        self.guest, self.booking = guest, booking
+        # Окно далеко в будущем, в котором у номера нет бронирований: для создания брони
+        self.window = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0) + timedelta(days=400)
+        busy = Booking.objects.filter(
+            check_in__lt=self.window + timedelta(days=2), check_out__gt=self.window
+        ).values('room_id')
+        self.room = Room.objects.filter(is_deleted=False).exclude(id__in=busy).order_by('id').first()
+        if self.room is None:
+            raise BenchmarkError('Не найден свободный номер для замера создания бронирования')
+        self.building_id = self.room.building_id
+        self.rooms = list(Room.objects.filter(is_deleted=False).order_by('id').values_list('id', flat=True)[:50])
+        self.import_data = self.import_rows()
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False, encoding='utf-8') as f:
+            json.dump(self.import_data, f, ensure_ascii=False)
+        self.import_file = f.name
+
+    def cases(self):
+        """(группа, название, метод, путь, функция, режим) для каждого замера"""
+        get = self.client.get
+        day = timezone.localdate()
+        check_in, check_out = self.window, self.window + timedelta(days=2)
+        booking_data = {
+            'guest_id': self.guest.id, 'room_id': self.room.id, 'people_count': 1,
+            'check_in': check_in.isoformat(), 'check_out': check_out.isoformat(),
+        }
+        calendar = f'/api/calendar/?from={day}&to={day + timedelta(days=30)}'
+        available = f'/api/rooms/available/?check_in={check_in.isoformat()}&check_out={check_out.isoformat()}'
+        endpoints = [
+            ('dashboard', '/api/dashboard/summary/'),
+            ('reports', f'/api/reports/?date_from={day - timedelta(days=365)}&date_to={day}'),
+            ('calendar', calendar),
+            ('calendar_building', f'{calendar}&building={self.building_id}'),
+            ('rooms', '/api/rooms/'),
+            ('rooms_available', available.replace('+', '%2B')),
+            ('buildings', '/api/buildings/'),
+            ('guests', '/api/guests/'),
+            ('guests_top_spent', '/api/guests/?ordering=-total_spent'),
+            ('guest_search_name', '/api/guests/search/?q=Асан'),
+            ('guest_search_phone', '/api/guests/search/?q=99670'),
+            ('guest_detail', f'/api/guests/{self.guest.id}/'),
+            ('bookings', '/api/bookings/'),
+            ('bookings_sparse', '/api/bookings/?fields=id,check_in,check_out,status,guest,room'),
+            ('bookings_building', f'/api/bookings/?building={self.building_id}'),
+            ('auditlog', '/api/auditlog/'),
+            ('users_me', '/api/users/me/'),
+        ]
+        if self.booking:
+            endpoints.append(('booking_detail', f'/api/bookings/{self.booking.id}/'))
+        for case, path in endpoints:
+            yield 'endpoint', case, 'GET', path, (lambda path=path: get(path)), READ
+        # Повторный запрос того же списка номеров - из кэша ответов
+        yield 'endpoint', 'rooms_cached', 'GET', '/api/rooms/', lambda: get('/api/rooms/'), CACHED
+
+        yield 'endpoint', 'booking_create', 'POST', '/api/bookings/', (
+            lambda: self.client.post('/api/bookings/', booking_data, format='json')
+        ), WRITE
+        if self.booking:
+            path = f'/api/bookings/{self.booking.id}/'
+            yield 'endpoint', 'booking_update', 'PATCH', path, (
+                lambda: self.client.patch(path, {'comments': 'benchmark'}, format='json')
+            ), WRITE
+        yield 'endpoint', 'rooms_bulk_update', 'PATCH', '/api/rooms/bulk/', (
+            lambda: self.client.patch('/api/rooms/bulk/', {'ids': self.rooms, 'changes': {'amenities': 'Wi-Fi'}}, format='json')
+        ), WRITE
+
+        yield from self.validator_cases(booking_data)
+        yield from self.command_cases()
+
+    def validator_cases(self, booking_data):
+        from .serializers import BookingSerializer, GuestSerializer, BookingImportRowSerializer
+
+        guest_data = {'full_name': 'Тестов Тест', 'phone': '+996999999999', 'inn': '12345678901234'}
+
+        def import_rows():
+            serializer = BookingImportRowSerializer()
+            for row in self.import_data:
+                serializer.run_validation(row)
+
+        yield 'validator', 'booking', None, None, lambda: BookingSerializer(data=booking_data).is_valid(raise_exception=True), READ
+        yield 'validator', 'guest', None, None, lambda: GuestSerializer(data=guest_data).is_valid(raise_exception=True), READ
+        yield 'validator', f'import_rows_{IMPORT_ROWS}', None, None, import_rows, READ
+
+    def command_cases(self):
+        def command(*args):
+            return lambda: call_command(*args, stdout=StringIO(), stderr=StringIO())
+
+        yield 'command', 'update_room_statuses', None, None, command('update_room_statuses', '--dry-run'), READ
+        yield 'command', 'reconcile_guest_stats', None, None, command('reconcile_guest_stats', '--dry-run'), READ
+        # Команда требует общего кэша, а бенчмарк идёт на кэше процесса: замеряем сам перенос
+        yield 'command', 'flush_presence', None, None, presence.flush, WRITE
+        yield 'command', 'import_bookings', None, None, command('import_bookings', self.import_file, '--dry-run'), READ
+
+    def import_rows(self):
+        """Строки импорта: новые гости на свободные интервалы далеко в будущем"""
+        start = self.window + timedelta(days=30)
+        return [
+            {
+                'full_name': f'Импортов Гость {i}', 'phone': f'+996998{i:06d}',
+                'room_id': self.room.id, 'people_count': 1,
+                'check_in': (start + timedelta(days=2 * i)).isoformat(),
+                'check_out': (start + timedelta(days=2 * i + 1)).isoformat(),
+            }
+            for i in range(IMPORT_ROWS)
+        ]
+
+    def measure(self, func, mode):
+        """Первый вызов - прогрев, он в результат не входит"""
+        timings, queries, response = [], 0, None
+        for attempt in range(self.repeat + 1):
+            if mode != CACHED:
+                cache.clear()
+            savepoint = transaction.savepoint() if mode == WRITE else None
+            try:
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = func()
+                    elapsed = time.perf_counter() - started
+            finally:
+                if savepoint:
+                    transaction.savepoint_rollback(savepoint)
+            if attempt:
+                timings.append(elapsed * 1000)
+                queries = len(captured)
+        result = {
+            'min_ms': round(min(timings), 2),
+            'median_ms': round(statistics.median(timings), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'queries': queries,
+        }
+        if hasattr(response, 'status_code'):
+            result['status'] = response.status_code
+            result['bytes'] = len(response.content)
+        return result
+
+
+def report(scales, repeat=5, seed=42, log=None):
+    """Отчёт для сохранения в JSON: окружение, объёмы данных и результаты по всем масштабам"""
+    suite = Suite(repeat=repeat, seed=seed, log=log)
+    data, results = {}, []
+    for scale in scales:
+        counts, scale_results = suite.run(scale)
+        data[parse_scale(scale)[0]] = counts
+        results.extend(scale_results)
+    return {
+        'meta': {
+            'created': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'repeat': suite.repeat,
+            'seed': seed,
+            'scales': data,
+        },
+        'results': results,
+    }
+
+
+def compare(current, baseline):
+    """Изменение медианы относительно прошлого отчёта: [(результат, было мс, изменение в %)]"""
+    previous = {(row['scale'], row['group'], row['name']): row for row in baseline.get('results', [])}
+    changes = []
+    for row in current['results']:
+        old = previous.get((row['scale'], row['group'], row['name']))
+        if old is None or not old['median_ms']:
+            changes.append((row, None, None))
+            continue
+        changes.append((row, old['median_ms'], round((row['median_ms'] / old['median_ms'] - 1) * 100, 1)))
+    return changes
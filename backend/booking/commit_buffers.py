@@ -0,0 +1,49 @@
+"""
+Буферы, привязанные к текущей транзакции.
+
+Данные копятся в буфере транзакции (или точки сохранения) и обрабатываются
+одним вызовом flush в transaction.on_commit. При откате точки сохранения
+её колбэк отбрасывается Django, и буфер начинается заново.
+
+Реестр хранит буферы по слабым ссылкам: сильную ссылку держит только
+колбэк on_commit. Откат отбрасывает колбэк, буфер удаляется сборщиком мусора
+и сам пропадает из реестра, поэтому проверять очередь колбэков не нужно.
+"""
+import threading
+from weakref import WeakValueDictionary
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+_local = threading.local()
+
+
+class CommitBuffer:
+    def __init__(self, registry, key, flush, items):
+        self.registry = registry
+        self.key = key
+        self.flush = flush
+        self.items = items
+
+    def run(self):
+        if self.registry.get(self.key) is self:
+            del self.registry[self.key]
+        self.flush(self.items)
+
+
+def get(name, flush, factory=list):
+    """
+    Возвращает контейнер буфера name для текущей транзакции; flush(контейнер)
+    будет вызван после коммита. Вне транзакции возвращает None.
+    """
+    connection = connections[DEFAULT_DB_ALIAS]
+    if not connection.in_atomic_block:
+        return None
+    registry = _local.__dict__.setdefault(name, WeakValueDictionary())
+    # Номера точек сохранения уникальны, так что ключ определяет блок atomic
+    key = tuple(connection.savepoint_ids)
+    buffer = registry.get(key)
+    if buffer is None:
+        buffer = CommitBuffer(registry, key, flush, factory())
+        registry[key] = buffer
+        transaction.on_commit(buffer.run)
+    return buffer.items
@@ -0,0 +1,132 @@
+"""
+Генератор правдоподобных демо-данных: корпуса, номера, гости, бронирования.
+
+Всё вставляется через bulk_create пачками, поэтому сигналы (журнал, статусы,
+статистика гостей) не срабатывают: статусы номеров и счётчики гостей
+пересчитываются в конце одним UPDATE. Бронирования одного номера идут друг за
+другом без пересечений, так что ограничение booking_no_overlap не нарушается.
+Один и тот же seed даёт одни и те же данные.
+"""
+import random
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+
+from . import guest_stats, room_status
+
+LAST_NAMES = [
+    ('Асанов', 'Асанова'), ('Исаков', 'Исакова'), ('Токтогулов', 'Токтогулова'), ('Бакиев', 'Бакиева'),
+    ('Иванов', 'Иванова'), ('Петров', 'Петрова'), ('Абдыкадыров', 'Абдыкадырова'), ('Осмонов', 'Осмонова'),
+    ('Жумабеков', 'Жумабекова'), ('Сидоров', 'Сидорова'), ('Мамытов', 'Мамытова'), ('Кузнецов', 'Кузнецова'),
+]
+FIRST_NAMES = [
+    (['Бакыт', 'Азамат', 'Нурлан', 'Тимур', 'Алексей', 'Эрлан', 'Дмитрий', 'Улан'], 0),
+    (['Айгуль', 'Жылдыз', 'Мария', 'Айпери', 'Елена', 'Гульнара', 'Анна', 'Нургуль'], 1),
+]
+PHONE_PREFIXES = ['700', '701', '550', '555', '777', '990']
+ADDRESSES = ['Чолпон-Ата', 'Бостери', 'Каракол', 'Бишкек', 'Ош', 'Алматы']
+ROOM_TYPES = {1: 'Одноместный', 2: 'Двухместный', 3: 'Трёхместный', 4: 'Семейный'}
+ROOM_CLASSES = [('standard', 1), ('standard', 1), ('standard', 1), ('semi_lux', 1.6), ('lux', 2.5)]
+
+
+def generate(buildings=10, rooms=2000, guests=200000, bookings=1000000, seed=42, batch_size=5000, log=None):
+    """Создаёт данные и возвращает количество созданных объектов по типам"""
+    from .models import Building, Room, Guest, Booking
+
+    rnd = random.Random(seed)
+    log = log or (lambda message: None)
+    now = timezone.now()
+
+    created_buildings = Building.objects.bulk_create([
+        Building(name=f'Корпус {i + 1}', address=ADDRESSES[i % len(ADDRESSES)], description='Демо-данные')
+        for i in range(buildings)
+    ])
+    log(f'Корпусов: {len(created_buildings)}')
+
+    room_objects = []
+    for i in range(rooms):
+        building = created_buildings[i % buildings]
+        capacity = rnd.choice([1, 2, 2, 2, 3, 4])
+        room_class, factor = rnd.choice(ROOM_CLASSES)
+        room_objects.append(Room(
+            building=building,
+            number=f'{i // buildings // 20 + 1}{i // buildings % 20 + 1:02d}',
+            capacity=capacity,
+            room_type=ROOM_TYPES[capacity],
+            room_class=room_class,
+            price_per_night=Decimal(int(1000 * capacity * factor / 100) * 100 + 500),
+            amenities=', '.join(rnd.sample(['Wi-Fi', 'Кондиционер', 'Холодильник', 'Телевизор', 'Балкон'], 2)),
+            status='repair' if rnd.random() < 0.02 else 'free',
+        ))
+    for offset in range(0, rooms, batch_size):
+        Room.objects.bulk_create(room_objects[offset:offset + batch_size])
+    room_data = list(Room.objects.filter(building__in=created_buildings).values_list('id', 'price_per_night', 'capacity'))
+    log(f'Номеров: {len(room_data)}')
+
+    guest_ids = []
+    for offset in range(0, guests, batch_size):
+        batch = []
+        for i in range(offset, min(offset + batch_size, guests)):
+            last = rnd.choice(LAST_NAMES)
+            first, gender = rnd.choice(FIRST_NAMES)
+            batch.append(Guest(
+                full_name=f'{last[gender]} {rnd.choice(first)}',
+                phone=f'+996{PHONE_PREFIXES[i % len(PHONE_PREFIXES)]}{i:06d}',
+                inn=f'{rnd.randint(10 ** 13, 10 ** 14 - 1)}' if rnd.random() < 0.6 else '',
+                email=f'guest{i}@example.com' if rnd.random() < 0.3 else '',
+                status='vip' if rnd.random() < 0.03 else 'active',
+            ))
+        guest_ids.extend(guest.pk for guest in Guest.objects.bulk_create(batch))
+    if guests and guest_ids[0] is None:
+        # БД не вернула id после bulk_create: берём последних созданных гостей
+        guest_ids = list(Guest.objects.order_by('-id').values_list('id', flat=True)[:guests])
+    log(f'Гостей: {len(guest_ids)}')
+
+    # У каждого номера своя цепочка бронирований: последние заканчиваются примерно через 60 дней
+    per_room, remainder = divmod(bookings, max(len(room_data), 1))
+    today_noon = timezone.make_aware(datetime.combine(now.date(), time(12)), timezone.get_current_timezone())
+    batch, total = [], 0
+    for index, (room_id, price, capacity) in enumerate(room_data):
+        count = per_room + (1 if index < remainder else 0)
+        check_in = today_noon + timedelta(days=60 - count * 10)
+        for _ in range(count):
+            check_in += timedelta(days=rnd.randint(0, 6))
+            nights = rnd.randint(1, 14)
+            check_out = check_in + timedelta(days=nights)
+            if check_out <= now:
+                booking_status = 'cancelled' if rnd.random() < 0.05 else 'completed'
+                payment_status = 'paid' if rnd.random() < 0.9 else 'unpaid'
+            else:
+                booking_status = 'cancelled' if rnd.random() < 0.05 else 'active'
+                payment_status = rnd.choice(['pending', 'pending', 'paid'])
+            total_amount = price * nights
+            batch.append(Booking(
+                guest_id=rnd.choice(guest_ids),
+                room_id=room_id,
+                check_in=check_in,
+                check_out=check_out,
+                people_count=rnd.randint(1, capacity),
+                status=booking_status,
+                payment_status=payment_status,
+                payment_amount=total_amount if payment_status == 'paid' else Decimal(0),
+                payment_method=rnd.choice(['cash', 'cash', 'card', 'transfer', 'online']),
+                total_amount=total_amount,
+            ))
+            check_in = check_out
+            if len(batch) >= batch_size:
+                Booking.objects.bulk_create(batch)
+                total += len(batch)
+                batch = []
+                if total % (batch_size * 20) == 0:
+                    log(f'Бронирований: {total}')
+    if batch:
+        Booking.objects.bulk_create(batch)
+        total += len(batch)
+    log(f'Бронирований: {total}')
+
+    room_status.recompute(rooms=Room.objects.filter(building__in=created_buildings))
+    if guest_ids:
+        guest_stats.recompute(guests=Guest.objects.filter(id__gte=min(guest_ids), id__lte=max(guest_ids)))
+    log('Статусы номеров и статистика гостей пересчитаны')
+    return {'buildings': len(created_buildings), 'rooms': len(room_data), 'guests': len(guest_ids), 'bookings': total}
@@ -0,0 +1,359 @@
+"""
+Поток изменений для клиентов: Server-Sent Events на /api/events/.
+
+Сигналы моделей и массовые операции публикуют компактные события
+booking.created / booking.updated / booking.cancelled / booking.deleted и
+room.status. События копятся до коммита транзакции (commit_buffers) и
+передаются брокеру одной пачкой; при откате они отбрасываются.
+
+Брокер задаётся настройкой EVENTS_BROKER:
+- InProcessBroker - события видят подписчики этого процесса (runserver, один воркер);
+- PostgresBroker - события рассылаются всем процессам через LISTEN/NOTIFY,
+  номера берутся из последовательности booking_event_seq (миграция 0011).
+
+Брокер хранит последние EVENTS_HISTORY событий в порядке поступления. Клиент,
+переподключившийся с Last-Event-ID, получает события, поступившие после
+события с этим номером (номера PostgresBroker изредка приходят не по порядку,
+поэтому сравнивать номера нельзя); если событие уже вытеснено или неизвестно
+процессу, клиент получает событие reset и загружает списки заново.
+"""
+import abc
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.module_loading import import_string
+
+from . import commit_buffers
+
+logger = logging.getLogger(__name__)
+
+BOOKING_CREATED = 'booking.created'
+BOOKING_UPDATED = 'booking.updated'
+BOOKING_CANCELLED = 'booking.cancelled'
+BOOKING_DELETED = 'booking.deleted'
+ROOM_STATUS = 'room.status'
+# Клиент пропустил события и должен загрузить данные заново
+RESET = 'reset'
+
+# Через сколько миллисекунд браузер переподключается после обрыва
+RETRY_MS = 3000
+
+
+def _reset(event_id):
+    return {'id': event_id, 'type': RESET, 'data': {}}
+
+
+class Subscription:
+    """Очередь событий одного клиента; ждать событий можно из потока (get) или из event loop (aget)"""
+
+    def __init__(self, broker, limit, loop=None):
+        self.broker = broker
+        self.limit = limit
+        self._pending = deque()
+        self._condition = threading.Condition()
+        self._loop = loop
+        self._wakeup = asyncio.Event() if loop is not None else None
+
+    def put(self, event):
+        with self._condition:
+            if len(self._pending) >= self.limit:
+                # Клиент не успевает читать: вместо очереди он получит reset
+                self._pending.clear()
+                self._pending.append(_reset(event['id']))
+            else:
+                self._pending.append(event)
+            self._condition.notify_all()
+        if self._loop is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._wakeup.set)
+            except RuntimeError:
+                pass  # event loop уже закрыт: клиент отключился
+
+    def get(self, timeout):
+        """Накопившиеся события; ждёт первого не дольше timeout секунд"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._pending, timeout)
+            return self._take()
+
+    async def aget(self, timeout):
+        """get() для event loop, в котором создана подписка"""
+        while True:
+            self._wakeup.clear()
+            with self._condition:
+                if self._pending:
+                    return self._take()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+
+    def _take(self):
+        events = list(self._pending)
+        self._pending.clear()
+        return events
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class Broker(abc.ABC):
+    """Основа брокера: история последних событий и рассылка подписчикам этого процесса"""
+
+    def __init__(self, history=None, queue_limit=None):
+        self.history = deque(maxlen=history or getattr(settings, 'EVENTS_HISTORY', 1000))
+        self.queue_limit = queue_limit or self.history.maxlen
+        # Номер, после которого история непрерывна: последнее вытесненное событие
+        # или момент, с которого процесс получает события
+        self.floor = 0
+        self._subscribers = set()
+        self._lock = threading.RLock()
+
+    @abc.abstractmethod
+    def publish(self, events):
+        """Публикует пачку событий [(тип, данные), ...]; вызывается после коммита"""
+
+    def subscribe(self, last_event_id=None, loop=None):
+        """Подписка; с last_event_id в неё сразу попадают пропущенные события или reset"""
+        subscription = Subscription(self, self.queue_limit, loop)
+        with self._lock:
+            self._subscribers.add(subscription)
+            if last_event_id is not None:
+                missed = self._missed(last_event_id)
+                if missed is None:
+                    subscription.put(_reset(self.history[-1]['id'] if self.history else self.floor))
+                else:
+                    for event in missed:
+                        subscription.put(event)
+        return subscription
+
+    def _missed(self, last_event_id):
+        """События, поступившие после события last_event_id; None - если оно неизвестно"""
+        if last_event_id == self.floor:
+            return list(self.history)
+        for position, event in enumerate(self.history):
+            if event['id'] == last_event_id:
+                return list(self.history)[position + 1:]
+        return None
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def _deliver(self, event):
+        with self._lock:
+            if len(self.history) == self.history.maxlen:
+                self.floor = self.history[0]['id']
+            self.history.append(event)
+            for subscription in self._subscribers:
+                subscription.put(event)
+
+
+class InProcessBroker(Broker):
+    """
+    События только этого процесса. Номер события - время в миллисекундах (не меньше
+    предыдущего + 1), поэтому номера растут и после перезапуска, а клиент с номером
+    из прошлого запуска получает reset.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.floor = int(time.time() * 1000)
+        self._last_id = self.floor
+
+    def publish(self, events):
+        with self._lock:
+            for event_type, data in events:
+                self._last_id = max(self._last_id + 1, int(time.time() * 1000))
+                self._deliver({'id': self._last_id, 'type': event_type, 'data': data})
+
+
+class PostgresBroker(Broker):
+    """
+    Рассылка через PostgreSQL LISTEN/NOTIFY. После коммита событие отправляется
+    pg_notify() с номером из booking_event_seq; поток-слушатель процесса
+    (запускается при первой подписке) получает события всех процессов в порядке отправки.
+    Номер выдаётся до отправки, поэтому при одновременной публикации из двух процессов
+    события изредка приходят не по порядку номеров: продолжение потока идёт по порядку
+    поступления (Broker._missed).
+    """
+    channel = 'booking_events'
+    sequence = 'booking_event_seq'
+    reconnect_delay = 5
+
+    def __init__(self, using=DEFAULT_DB_ALIAS, **kwargs):
+        super().__init__(**kwargs)
+        self.using = using
+        self._listener = None
+        self._ready = threading.Event()
+
+    def publish(self, events):
+        with connections[self.using].cursor() as cursor:
+            cursor.executemany(
+                f"SELECT pg_notify(%s, json_build_object("
+                f"'id', nextval('{self.sequence}'), 'type', %s, 'data', %s::json)::text)",
+                [(self.channel, event_type, json.dumps(data, ensure_ascii=False)) for event_type, data in events],
+            )
+
+    def subscribe(self, last_event_id=None, loop=None):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='events-listener', daemon=True)
+                self._listener.start()
+        # Номер, с которого процесс знает события, определяется при подключении слушателя
+        self._ready.wait(self.reconnect_delay)
+        return super().subscribe(last_event_id, loop)
+
+    def _listen(self):
+        while True:
+            try:
+                self._listen_once()
+            except Exception:
+                logger.exception('Слушатель событий PostgreSQL отключился, переподключение')
+            time.sleep(self.reconnect_delay)
+
+    def _listen_once(self):
+        wrapper = connections.create_connection(self.using)
+        raw = wrapper.get_new_connection(wrapper.get_connection_params())
+        try:
+            raw.autocommit = True
+            with raw.cursor() as cursor:
+                cursor.execute(f'LISTEN {self.channel}')
+                cursor.execute(f'SELECT last_value, is_called FROM {self.sequence}')
+                last_value, is_called = cursor.fetchone()
+            self._connected(last_value if is_called else last_value - 1)
+            if hasattr(raw, 'poll'):
+                # psycopg2
+                while True:
+                    if select.select([raw], [], [], self.reconnect_delay) == ([], [], []):
+                        continue
+                    raw.poll()
+                    while raw.notifies:
+                        self._deliver(json.loads(raw.notifies.pop(0).payload))
+            else:
+                # psycopg 3
+                while True:
+                    for notify in raw.notifies(timeout=self.reconnect_delay):
+                        self._deliver(json.loads(notify.payload))
+        finally:
+            raw.close()
+
+    def _connected(self, last_id):
+        with self._lock:
+            known = max((event['id'] for event in self.history), default=self.floor)
+            if last_id > known:
+                # Пока слушатель был отключён, события могли пройти мимо: история больше
+                # не непрерывна, подписчики загрузят данные заново
+                self.history.clear()
+                self.floor = last_id
+                if self._ready.is_set():
+                    for subscription in self._subscribers:
+                        subscription.put(_reset(self.floor))
+        self._ready.set()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(getattr(settings, 'EVENTS_BROKER', 'booking.events.InProcessBroker'))()
+        return _broker
+
+
+def publish(event_type, data):
+    """Публикует событие после коммита текущей транзакции (при откате оно отбрасывается)"""
+    pending = commit_buffers.get('events', _flush)
+    if pending is None:
+        _flush([(event_type, data)])
+    else:
+        pending.append((event_type, data))
+
+
+def _flush(events):
+    try:
+        get_broker().publish(events)
+    except Exception:
+        # Данные уже сохранены: клиенты без этих событий догонят состояние после reset
+        logger.exception('Не удалось опубликовать события')
+
+
+def booking_data(booking):
+    """Компактное представление бронирования; имя гостя - только если гость уже загружен"""
+    from .models import Booking
+    from .reports import short_name
+
+    data = {
+        'id': booking.id,
+        'room_id': booking.room_id,
+        'guest_id': booking.guest_id,
+        'check_in': booking.check_in.isoformat(),
+        'check_out': booking.check_out.isoformat(),
+        'status': booking.status,
+        'payment_status': booking.payment_status,
+    }
+    if Booking.guest.is_cached(booking):
+        data['guest'] = short_name(booking.guest.full_name)
+    return data
+
+
+def publish_booking(booking, created=False, deleted=False):
+    if created:
+        event_type = BOOKING_CREATED
+    elif deleted or booking.is_deleted:
+        event_type = BOOKING_DELETED
+    elif booking.status == 'cancelled' and getattr(booking, '_loaded_status', None) != 'cancelled':
+        event_type = BOOKING_CANCELLED
+    else:
+        event_type = BOOKING_UPDATED
+    booking._loaded_status = booking.status
+    publish(event_type, booking_data(booking))
+
+
+def publish_room_status(room_id, building_id, status):
+    publish(ROOM_STATUS, {'id': room_id, 'building_id': building_id, 'status': status})
+
+
+def format_event(event):
+    lines = [f"id: {event['id']}"] if event['id'] is not None else []
+    lines.append(f"event: {event['type']}")
+    lines.append(f"data: {json.dumps(event['data'], ensure_ascii=False, separators=(',', ':'))}")
+    return ('\n'.join(lines) + '\n\n').encode()
+
+
+def _limits():
+    heartbeat = getattr(settings, 'EVENTS_HEARTBEAT', 15)
+    return heartbeat, time.monotonic() + getattr(settings, 'EVENTS_STREAM_TIMEOUT', 300)
+
+
+def stream(subscription):
+    """Тело ответа SSE для WSGI: подключение занимает поток сервера"""
+    heartbeat, deadline = _limits()
+    try:
+        yield f'retry: {RETRY_MS}\n\n'.encode()
+        while (left := deadline - time.monotonic()) > 0:
+            events = subscription.get(min(heartbeat, left))
+            yield b''.join(map(format_event, events)) if events else b': ping\n\n'
+    finally:
+        subscription.close()
+
+
+async def astream(subscription):
+    """Тело ответа SSE для ASGI"""
+    heartbeat, deadline = _limits()
+    try:
+        yield f'retry: {RETRY_MS}\n\n'.encode()
+        while (left := deadline - time.monotonic()) > 0:
+            events = await subscription.aget(min(heartbeat, left))
+            yield b''.join(map(format_event, events)) if events else b': ping\n\n'
+    finally:
+        subscription.close()
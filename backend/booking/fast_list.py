@@ -0,0 +1,152 @@
+"""
+Быстрый путь list(): строки берутся через .values() и превращаются в JSON-структуру
+заранее скомпилированной функцией, без создания моделей и обхода полей DRF на каждую строку.
+
+Функция строится один раз по классу сериализатора и даёт тот же ответ, что и
+сериализатор: простые поля копируются как есть, остальные проходят через
+to_representation соответствующего поля DRF, вложенные сериализаторы
+разворачиваются в колонки связанной модели. Поля без прямого source
+(SerializerMethodField) описываются в Meta.fast_fields: {'поле': (колонки, функция)}.
+"""
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from . import performance
+from .renderers import ORJSONRenderer
+from .sparse import is_sparse
+
+# Поля, значение которых из .values() уже совпадает с представлением DRF
+IDENTITY_FIELDS = (
+    serializers.CharField,
+    serializers.IntegerField,
+    serializers.BooleanField,
+    serializers.ChoiceField,
+    serializers.PrimaryKeyRelatedField,
+    serializers.ReadOnlyField,
+)
+
+_compiled = {}
+
+
+class RowTransformer:
+    """Колонки для .values() и функция row -> dict в формате сериализатора"""
+
+    def __init__(self, serializer_class):
+        self.namespace = {'_current_timezone': timezone.get_current_timezone}
+        self.columns = []
+        expression = self._compile(serializer_class(), '')
+        # Часовой пояс берётся один раз на весь список, а не на каждое значение
+        source = (
+            'def transform_many(rows):\n'
+            '    tz = _current_timezone()\n'
+            f'    return [{expression} for row in rows]\n'
+        )
+        exec(compile(source, f'<fast_list {serializer_class.__name__}>', 'exec'), self.namespace)
+        self.transform_many = self.namespace['transform_many']
+        self.columns = list(dict.fromkeys(self.columns))
+
+    def transform(self, row):
+        return self.transform_many([row])[0]
+
+    def _name(self, value):
+        name = f'_f{len(self.namespace)}'
+        self.namespace[name] = value
+        return name
+
+    def _column(self, column):
+        self.columns.append(column)
+        return f'row[{column!r}]'
+
+    def _compile(self, serializer, prefix):
+        meta = getattr(serializer, 'Meta', None)
+        fast_fields = getattr(meta, 'fast_fields', {})
+        items = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if name in fast_fields:
+                columns, func = fast_fields[name]
+                args = ', '.join(self._column(prefix + column) for column in columns)
+                value = f'{self._name(func)}({args})'
+            elif isinstance(field, serializers.BaseSerializer):
+                related = prefix + '__'.join(field.source_attrs)
+                pk = self._column(f'{related}__{field.Meta.model._meta.pk.name}')
+                value = f'(None if {pk} is None else {self._compile(field, related + "__")})'
+            elif field.source == '*':
+                raise ImproperlyConfigured(
+                    f'{type(serializer).__name__}.{name}: опишите поле в Meta.fast_fields для быстрого списка'
+                )
+            else:
+                value = self._column(prefix + '__'.join(field.source_attrs))
+                if self._is_iso_datetime(field):
+                    converter = self._name(_datetime_converter(field.to_representation))
+                    value = f'(None if {value} is None else {converter}({value}, tz))'
+                elif not isinstance(field, IDENTITY_FIELDS):
+                    value = f'(None if {value} is None else {self._name(field.to_representation)}({value}))'
+            items.append(f'{name!r}: {value}')
+        return '{' + ', '.join(items) + '}'
+
+
+    @staticmethod
+    def _is_iso_datetime(field):
+        return (
+            isinstance(field, serializers.DateTimeField)
+            and settings.USE_TZ
+            and getattr(field, 'timezone', None) is None
+            and getattr(field, 'format', api_settings.DATETIME_FORMAT) == ISO_8601
+        )
+
+
+def _datetime_converter(fallback):
+    """DateTimeField.to_representation для ISO 8601 с часовым поясом, вычисленным заранее"""
+    def convert(value, tz):
+        if value.tzinfo is None:
+            return fallback(value)
+        value = value.astimezone(tz).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return convert
+
+
+def transformer(serializer_class):
+    """Скомпилированный RowTransformer для класса сериализатора (кэшируется)"""
+    if serializer_class not in _compiled:
+        _compiled[serializer_class] = RowTransformer(serializer_class)
+    return _compiled[serializer_class]
+
+
+class FastListMixin:
+    """
+    Viewset: list() через .values() и RowTransformer, ответ рендерится orjson.
+    Выключается атрибутом fast_list = False; с ?fields=/?expand= используется сериализатор.
+    """
+    fast_list = True
+    renderer_classes = [ORJSONRenderer] + [
+        renderer for renderer in api_settings.DEFAULT_RENDERER_CLASSES
+        if renderer.format != 'json'
+    ]
+
+    def fast_queryset(self):
+        """Отфильтрованный queryset .values() и RowTransformer для него (без обращения к БД)"""
+        rows = transformer(self.get_serializer_class())
+        # Курсору нужны значения полей сортировки в каждой строке
+        ordering = getattr(self, 'cursor_ordering', ())
+        ordering = (ordering,) if isinstance(ordering, str) else ordering
+        columns = dict.fromkeys(rows.columns + [field.lstrip('-') for field in ordering])
+        return self.filter_queryset(self.get_queryset()).values(*columns), rows
+
+    def list(self, request, *args, **kwargs):
+        with performance.timed('serialize'):
+            return self._list(request, *args, **kwargs)
+
+    def _list(self, request, *args, **kwargs):
+        if not self.fast_list or is_sparse(request):
+            return super().list(request, *args, **kwargs)
+        queryset, rows = self.fast_queryset()
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(rows.transform_many(page))
+        return Response(rows.transform_many(queryset))
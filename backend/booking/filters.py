@@ -0,0 +1,28 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework import serializers
+from rest_framework.filters import BaseFilterBackend
+
+
+class QueryParamFilterBackend(BaseFilterBackend):
+    """
+    Декларативные фильтры по query-параметрам.
+    Viewset описывает их словарём query_filters: {'параметр': 'lookup ORM'}, например
+    {'status': 'status', 'date_from': 'check_in__date__gte'}.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        query_filters = getattr(view, 'query_filters', {})
+        lookups = {}
+        for param, lookup in query_filters.items():
+            value = request.query_params.get(param)
+            if value in (None, ''):
+                continue
+            if value.lower() in ('true', 'false'):
+                value = value.lower() == 'true'
+            lookups[lookup] = value
+        if not lookups:
+            return queryset
+        try:
+            return queryset.filter(**lookups)
+        except (ValueError, TypeError, DjangoValidationError):
+            raise serializers.ValidationError({'error': 'Некорректное значение фильтра'})
@@ -0,0 +1,101 @@
+"""
+Денормализованная статистика гостя: Guest.total_spent и Guest.visits_count.
+
+total_spent - сумма оплаченных неудалённых бронирований (то же, что guest_paid_total),
+visits_count - число неудалённых и неотменённых бронирований.
+При сохранении бронирования счётчики гостя меняются атомарным UPDATE с F()
+на разницу между прежним и новым вкладом бронирования, в той же транзакции.
+Полный пересчёт с отчётом о расхождениях - recompute() и команда reconcile_guest_stats.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+# Поля бронирования, от которых зависит его вклад в статистику гостя
+BOOKING_FIELDS = ('guest_id', 'payment_status', 'status', 'is_deleted', 'total_amount')
+
+
+def snapshot(booking):
+    """Вклад бронирования: (guest_id, сумма, визиты) или None, если поля загружены не все"""
+    data = booking.__dict__
+    if any(field not in data for field in BOOKING_FIELDS):
+        return None
+    if data['is_deleted']:
+        return (data['guest_id'], Decimal(0), 0)
+    spent = Decimal(data['total_amount'] or 0) if data['payment_status'] == 'paid' else Decimal(0)
+    return (data['guest_id'], spent, 0 if data['status'] == 'cancelled' else 1)
+
+
+def apply(old, new):
+    """Переносит статистику гостей со старого вклада бронирования на новый"""
+    deltas = defaultdict(lambda: [Decimal(0), 0])
+    for item, sign in ((old, -1), (new, 1)):
+        if item is not None:
+            guest_id, spent, visits = item
+            deltas[guest_id][0] += sign * spent
+            deltas[guest_id][1] += sign * visits
+    add(deltas)
+
+
+def add_bookings(bookings):
+    """Добавляет вклад новых бронирований (например, после bulk_create, который не вызывает сигналы)"""
+    deltas = defaultdict(lambda: [Decimal(0), 0])
+    for booking in bookings:
+        guest_id, spent, visits = snapshot(booking)
+        deltas[guest_id][0] += spent
+        deltas[guest_id][1] += visits
+    add(deltas)
+
+
+def add(deltas):
+    """deltas: {guest_id: (сумма, визиты)}; гости с одинаковой разницей обновляются одним UPDATE"""
+    from .models import Guest
+
+    groups = defaultdict(list)
+    for guest_id, (spent, visits) in deltas.items():
+        if spent or visits:
+            groups[(spent, visits)].append(guest_id)
+    for (spent, visits), guest_ids in groups.items():
+        Guest.objects.filter(pk__in=guest_ids).update(
+            total_spent=F('total_spent') + spent,
+            visits_count=Greatest(F('visits_count') + visits, Value(0)),
+        )
+
+
+def visits_expression():
+    """Подзапрос: число неудалённых и неотменённых бронирований гостя"""
+    from .models import Booking
+
+    visits = Booking.objects.filter(
+        guest=OuterRef('pk'), is_deleted=False
+    ).exclude(status='cancelled').order_by().values('guest').annotate(count=Count('id')).values('count')
+    return Coalesce(Subquery(visits), Value(0))
+
+
+def recompute(guest_ids=None, guests=None, dry_run=False):
+    """
+    Пересчитывает статистику гостей по бронированиям.
+    guest_ids=None - все гости; guests - готовый queryset для отбора.
+    Возвращает расхождения [(id, сумма было, стало, визиты было, стало), ...].
+    """
+    from .models import Guest, guest_paid_total
+
+    if guests is None:
+        guests = Guest.objects.all()
+    if guest_ids is not None:
+        if not guest_ids:
+            return []
+        guests = guests.filter(id__in=guest_ids)
+
+    drifted = guests.annotate(new_spent=guest_paid_total(), new_visits=visits_expression()).filter(
+        ~Q(total_spent=F('new_spent')) | ~Q(visits_count=F('new_visits'))
+    )
+    drift = list(drifted.values_list('id', 'total_spent', 'new_spent', 'visits_count', 'new_visits'))
+    if drift and not dry_run:
+        # Подзапрос вместо списка id: расхождений может быть больше, чем допускает IN (...) в SQLite
+        Guest.objects.filter(id__in=drifted.values('id')).update(
+            total_spent=guest_paid_total(), visits_count=visits_expression()
+        )
+    return drift
@@ -0,0 +1,211 @@
+"""
+Массовый импорт бронирований (и новых гостей) из CSV или JSON.
+
+Все строки проверяются за один проход: формат полей - без запросов к БД,
+номера и гости загружаются одним запросом каждый, пересечения с уже
+существующими бронированиями - одним запросом на все номера файла,
+пересечения строк файла между собой - в памяти. Затем гости и бронирования
+вставляются через bulk_create в одной транзакции.
+"""
+import csv
+import io
+import json
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from rest_framework import serializers
+
+from . import audit, events, guest_stats, room_status
+from .models import Booking, Guest, Room, BOOKING_OVERLAP_CONSTRAINT
+from .serializers import BookingImportRowSerializer
+
+
+class ImportFormatError(ValueError):
+    """Файл импорта не удалось разобрать"""
+
+
+def parse_rows(content, fmt):
+    """Разбирает CSV (первая строка - заголовки) или JSON (список объектов или {"rows": [...]})"""
+    if isinstance(content, bytes):
+        content = content.decode('utf-8-sig')
+    if fmt == 'csv':
+        reader = csv.DictReader(io.StringIO(content))
+        return [{key: value for key, value in row.items() if value not in (None, '')} for row in reader]
+    if fmt == 'json':
+        try:
+            data = json.loads(content)
+        except ValueError as e:
+            raise ImportFormatError(f"Некорректный JSON: {e}")
+        if isinstance(data, dict):
+            data = data.get('rows')
+        if not isinstance(data, list):
+            raise ImportFormatError("Ожидается список строк или объект с ключом rows")
+        return data
+    raise ImportFormatError("Поддерживаются форматы csv и json")
+
+
+def _overlaps(a_in, a_out, b_in, b_out):
+    return a_in < b_out and a_out > b_in
+
+
+def import_bookings(rows, user=None, partial=False, dry_run=False):
+    """
+    Проверяет и импортирует строки. Возвращает отчёт:
+    {'created': N, 'guests_created': M, 'errors': [{'row': номер, 'errors': ...}]}.
+    По умолчанию при любой ошибке ничего не сохраняется; partial=True сохраняет корректные строки.
+    """
+    errors = {}
+    valid = {}
+    serializer = BookingImportRowSerializer()
+    for index, row in enumerate(rows, start=1):
+        try:
+            valid[index] = serializer.run_validation(row if isinstance(row, dict) else {})
+        except serializers.ValidationError as e:
+            errors[index] = serializers.as_serializer_error(e)
+
+    rooms = Room.objects.filter(is_deleted=False).select_related('building').in_bulk(
+        {data['room_id'] for data in valid.values()}
+    )
+    guest_ids = set(Guest.objects.filter(
+        id__in={data['guest_id'] for data in valid.values() if data.get('guest_id')}
+    ).values_list('id', flat=True))
+
+    for index, data in list(valid.items()):
+        room = rooms.get(data['room_id'])
+        if room is None:
+            errors[index] = {'room_id': [f"Номер #{data['room_id']} не найден"]}
+        elif data['people_count'] > room.capacity:
+            errors[index] = {'non_field_errors': [f"Номер вмещает максимум {room.capacity} гостей"]}
+        elif data.get('guest_id') and data['guest_id'] not in guest_ids:
+            errors[index] = {'guest_id': [f"Гость #{data['guest_id']} не найден"]}
+        else:
+            continue
+        del valid[index]
+
+    # Пересечения: существующие бронирования всех номеров файла одним запросом + строки файла между собой
+    if valid:
+        by_room = defaultdict(list)
+        for index, data in valid.items():
+            by_room[data['room_id']].append(index)
+        existing = defaultdict(list)
+        min_in = min(data['check_in'] for data in valid.values())
+        max_out = max(data['check_out'] for data in valid.values())
+        for room_id, booking_id, check_in, check_out in Booking.objects.filter(
+            room_id__in=by_room.keys(), status='active', is_deleted=False,
+            check_in__lt=max_out, check_out__gt=min_in,
+        ).values_list('room_id', 'id', 'check_in', 'check_out'):
+            existing[room_id].append((booking_id, check_in, check_out))
+
+        for room_id, indexes in by_room.items():
+            accepted = []
+            for index in sorted(indexes, key=lambda i: valid[i]['check_in']):
+                data = valid[index]
+                conflict = next(
+                    (booking_id for booking_id, check_in, check_out in existing[room_id]
+                     if _overlaps(data['check_in'], data['check_out'], check_in, check_out)),
+                    None
+                )
+                if conflict:
+                    errors[index] = {'non_field_errors': [
+                        f"Номер уже забронирован на эти даты (бронирование #{conflict})"
+                    ]}
+                    continue
+                clash = next(
+                    (other for other in accepted
+                     if _overlaps(data['check_in'], data['check_out'], valid[other]['check_in'], valid[other]['check_out'])),
+                    None
+                )
+                if clash:
+                    errors[index] = {'non_field_errors': [f"Пересекается со строкой {clash} файла"]}
+                    continue
+                accepted.append(index)
+        valid = {index: data for index, data in valid.items() if index not in errors}
+
+    report = {
+        'created': 0,
+        'guests_created': 0,
+        'errors': [{'row': index, 'errors': errors[index]} for index in sorted(errors)],
+    }
+    if (errors and not partial) or dry_run or not valid:
+        return report
+
+    try:
+        with transaction.atomic():
+            report['guests_created'] = _attach_guests(valid)
+            bookings = []
+            for index in sorted(valid):
+                data = valid[index]
+                room = rooms[data['room_id']]
+                bookings.append(Booking(
+                    guest_id=data['guest_id'],
+                    room=room,
+                    check_in=data['check_in'],
+                    check_out=data['check_out'],
+                    people_count=data['people_count'],
+                    payment_status=data['payment_status'],
+                    payment_method=data['payment_method'],
+                    payment_amount=data['payment_amount'],
+                    comments=data['comments'],
+                    total_amount=room.price_per_night * (data['check_out'] - data['check_in']).days,
+                    created_by=user,
+                ))
+            Booking.objects.bulk_create(bookings, batch_size=500)
+            # bulk_create не вызывает сигналы: журнал, статусы номеров и статистику гостей обновляем сами
+            for booking in bookings:
+                audit.log(
+                    user=user,
+                    action='Создание',
+                    object_type='Booking',
+                    object_id=booking.id,
+                    details=f'Импорт: бронирование номера {booking.room} с {booking.check_in} '
+                            f'по {booking.check_out}, гостей: {booking.people_count}'
+                )
+                events.publish_booking(booking, created=True)
+            room_status.schedule(*{booking.room_id for booking in bookings})
+            guest_stats.add_bookings(bookings)
+    except IntegrityError as e:
+        # Параллельное бронирование успело занять номер (ограничение PostgreSQL)
+        if BOOKING_OVERLAP_CONSTRAINT not in str(e):
+            raise
+        report['errors'].append({'row': None, 'errors': {
+            'non_field_errors': ["Номер уже забронирован на эти даты параллельным запросом, повторите импорт"]
+        }})
+        return report
+
+    report['created'] = len(bookings)
+    return report
+
+
+def _attach_guests(valid):
+    """Находит существующих гостей по ИНН или телефону, недостающих создаёт одним bulk_create"""
+    inline = {index: data['guest'] for index, data in valid.items() if not data.get('guest_id')}
+    if not inline:
+        return 0
+    phones = {guest['phone'] for guest in inline.values()}
+    inns = {guest['inn'] for guest in inline.values() if guest.get('inn')}
+    by_inn, by_phone = {}, {}
+    for guest_id, phone, inn in Guest.objects.filter(
+        Q(phone__in=phones) | Q(inn__in=inns), is_deleted=False
+    ).values_list('id', 'phone', 'inn'):
+        by_phone.setdefault(phone, guest_id)
+        if inn:
+            by_inn.setdefault(inn, guest_id)
+
+    new_guests = {}
+    for index, guest in inline.items():
+        guest_id = by_inn.get(guest.get('inn')) or by_phone.get(guest['phone'])
+        if guest_id:
+            valid[index]['guest_id'] = guest_id
+            continue
+        # Один и тот же новый гость в нескольких строках создаётся один раз
+        key = guest.get('inn') or guest['phone']
+        if key not in new_guests:
+            new_guests[key] = Guest(**guest)
+        valid[index]['new_guest'] = new_guests[key]
+
+    Guest.objects.bulk_create(new_guests.values())
+    for index, data in valid.items():
+        if 'new_guest' in data:
+            data['guest_id'] = data.pop('new_guest').id
+    return len(new_guests)
@@ -0,0 +1,292 @@
+"""
+Нагрузочный тест: смесь запросов стойки регистрации и администраторов
+(сводка, шахматка, поиск гостя, создание бронирования) из пула потоков.
+
+Запросы идут либо прямо в приложение (InProcessTransport, тестовый клиент
+Django без сети), либо на локальный сервер по HTTP (HttpTransport, urllib).
+Бронирования создаются на небольшой набор номеров в одном окне дат, чтобы
+параллельные запросы действительно конкурировали за одни и те же даты:
+отказ из-за пересечения - ожидаемый ответ, а два активных пересекающихся
+бронирования после прогона - ошибка (двойное бронирование).
+"""
+import json
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .benchmarks import percentile
+
+# Вес сценария в смеси запросов по умолчанию
+DEFAULT_MIX = {'dashboard': 3, 'calendar': 2, 'search': 4, 'booking': 1}
+# Окно дат для создаваемых бронирований: далеко в будущем, чтобы не задевать реальные
+BOOKING_WINDOW_OFFSET = 300
+BOOKING_WINDOW_DAYS = 30
+CONFLICT_MESSAGE = 'уже забронирован'
+SEARCH_TERMS = ['Асан', 'Иван', 'Петр', 'Бакыт', 'Айгуль', 'Мария', '99670', '99655', '777']
+
+
+class LoadTestError(Exception):
+    """Нагрузочный тест невозможно запустить (нет данных, не удалось войти)"""
+
+
+class InProcessTransport:
+    """Запросы через тестовый клиент Django в этом же процессе; у каждого потока свой клиент"""
+
+    def __init__(self, user):
+        self.user = user
+        self._local = threading.local()
+
+    def request(self, method, path, data=None):
+        from rest_framework.test import APIClient
+
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = APIClient(SERVER_NAME='localhost')
+            client.force_authenticate(self.user)
+        response = getattr(client, method.lower())(path, data, format='json') if data is not None \
+            else getattr(client, method.lower())(path)
+        return response.status_code, response.content
+
+    def close(self):
+        from django.db import connections
+        connections.close_all()
+
+
+class HttpTransport:
+    """Запросы по HTTP к запущенному серверу (например, manage.py runserver) с JWT-токеном"""
+
+    def __init__(self, base_url, token=None, username=None, password=None, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.token = token
+        if not token:
+            status, body = self.request('POST', '/api/auth/token/', {'username': username, 'password': password})
+            if status != 200:
+                raise LoadTestError(f'Не удалось получить токен ({status}): {body[:200]!r}')
+            self.token = json.loads(body)['access']
+
+    def request(self, method, path, data=None):
+        headers = {'Accept': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        body = None
+        if data is not None:
+            body = json.dumps(data).encode()
+            headers['Content-Type'] = 'application/json'
+        request = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+        except (urllib.error.URLError, OSError) as e:
+            # Сервер недоступен или оборвал соединение: статус 0 считается ошибкой
+            return 0, str(e).encode()
+
+    def close(self):
+        pass
+
+
+def _results(body):
+    data = json.loads(body)
+    return data['results'] if isinstance(data, dict) else data
+
+
+class LoadTest:
+    def __init__(self, transport, mix=None, concurrency=10, requests=500, duration=None, room_pool=10, seed=42):
+        self.transport = transport
+        self.mix = {name: weight for name, weight in (mix or DEFAULT_MIX).items() if weight > 0}
+        unknown = set(self.mix) - set(self.scenarios())
+        if unknown or not self.mix:
+            raise LoadTestError(f"Неизвестные сценарии: {', '.join(sorted(unknown)) or '-'}; "
+                                f"доступны: {', '.join(self.scenarios())}")
+        self.concurrency = max(1, concurrency)
+        self.requests = requests
+        self.duration = duration
+        self.room_pool = room_pool
+        self.seed = seed
+        self._lock = threading.Lock()
+        self._issued = 0
+
+    @classmethod
+    def scenarios(cls):
+        return {
+            'dashboard': cls.dashboard,
+            'calendar': cls.calendar,
+            'search': cls.search,
+            'booking': cls.booking,
+            'available': cls.available,
+            'bookings': cls.bookings,
+        }
+
+    def prepare(self):
+        """Номера и гости для сценариев берутся через API, как их увидел бы клиент"""
+        rnd = random.Random(self.seed)
+        status, body = self.transport.request('GET', '/api/rooms/?page_size=500&fields=id,capacity,is_active,status')
+        if status != 200:
+            raise LoadTestError(f'Не удалось загрузить номера ({status}): {body[:200]!r}')
+        rooms = [room['id'] for room in _results(body) if room.get('is_active', True) and room['status'] != 'repair']
+        status, body = self.transport.request('GET', '/api/guests/?page_size=500&fields=id')
+        if status != 200:
+            raise LoadTestError(f'Не удалось загрузить гостей ({status}): {body[:200]!r}')
+        self.guests = [guest['id'] for guest in _results(body)]
+        if not rooms or not self.guests:
+            raise LoadTestError('Нужны номера и гости: заполните базу, например, командой generate_demo_data')
+        self.rooms = rnd.sample(rooms, min(self.room_pool, len(rooms)))
+        self.window_start = (timezone.now() + timedelta(days=BOOKING_WINDOW_OFFSET)).replace(
+            hour=12, minute=0, second=0, microsecond=0
+        )
+        self.today = timezone.localdate()
+
+    # Сценарии: (название для отчёта, метод, путь, данные)
+
+    def dashboard(self, rnd):
+        return 'dashboard', 'GET', '/api/dashboard/summary/', None
+
+    def calendar(self, rnd):
+        start = self.today + timedelta(days=rnd.randint(-7, 30))
+        return 'calendar', 'GET', f'/api/calendar/?{urlencode({"from": start, "to": start + timedelta(days=30)})}', None
+
+    def search(self, rnd):
+        return 'search', 'GET', f'/api/guests/search/?{urlencode({"q": rnd.choice(SEARCH_TERMS)})}', None
+
+    def available(self, rnd):
+        check_in = self.window_start + timedelta(days=rnd.randint(0, BOOKING_WINDOW_DAYS))
+        query = urlencode({'check_in': check_in.isoformat(), 'check_out': (check_in + timedelta(days=2)).isoformat()})
+        return 'available', 'GET', f'/api/rooms/available/?{query}', None
+
+    def bookings(self, rnd):
+        return 'bookings', 'GET', '/api/bookings/', None
+
+    def booking(self, rnd):
+        check_in = self.window_start + timedelta(days=rnd.randint(0, BOOKING_WINDOW_DAYS))
+        return 'booking', 'POST', '/api/bookings/', {
+            'guest_id': rnd.choice(self.guests),
+            'room_id': rnd.choice(self.rooms),
+            'people_count': 1,
+            'check_in': check_in.isoformat(),
+            'check_out': (check_in + timedelta(days=rnd.randint(1, 3))).isoformat(),
+        }
+
+    def _next(self, deadline):
+        with self._lock:
+            if self.requests and self._issued >= self.requests:
+                return False
+            if deadline and time.perf_counter() >= deadline:
+                return False
+            self._issued += 1
+            return True
+
+    def _worker(self, index, deadline):
+        rnd = random.Random(self.seed * 1000 + index)
+        scenarios = self.scenarios()
+        names, weights = list(self.mix), list(self.mix.values())
+        samples = []
+        try:
+            while self._next(deadline):
+                name, method, path, data = scenarios[rnd.choices(names, weights)[0]](self, rnd)
+                started = time.perf_counter()
+                status, body = self.transport.request(method, path, data)
+                samples.append((name, (time.perf_counter() - started) * 1000, status, body if method != 'GET' else b''))
+        finally:
+            self.transport.close()
+        return samples
+
+    def run(self):
+        """Прогон; возвращает отчёт (см. summarize)"""
+        self.prepare()
+        self._issued = 0
+        started = time.perf_counter()
+        deadline = started + self.duration if self.duration else None
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = [pool.submit(self._worker, index, deadline) for index in range(self.concurrency)]
+            samples = [sample for future in futures for sample in future.result()]
+        elapsed = time.perf_counter() - started
+        return self.summarize(samples, elapsed)
+
+    def summarize(self, samples, elapsed):
+        per_endpoint = defaultdict(list)
+        statuses = defaultdict(Counter)
+        conflicts, errors, created = 0, [], []
+        for name, ms, status, body in samples:
+            per_endpoint[name].append(ms)
+            statuses[name][status] += 1
+            if name == 'booking' and status == 201:
+                created.append(json.loads(body)['id'])
+            elif name == 'booking' and status == 400 and CONFLICT_MESSAGE in body.decode(errors='replace'):
+                conflicts += 1
+            elif status == 0 or status >= 400:
+                errors.append({'endpoint': name, 'status': status, 'body': body.decode(errors='replace')[:300]})
+
+        endpoints = {}
+        for name, timings in sorted(per_endpoint.items()):
+            endpoints[name] = {
+                'requests': len(timings),
+                'rps': round(len(timings) / elapsed, 1),
+                'p50_ms': round(statistics.median(timings), 1),
+                'p95_ms': round(percentile(timings, 95), 1),
+                'p99_ms': round(percentile(timings, 99), 1),
+                'max_ms': round(max(timings), 1),
+                'statuses': {str(status): count for status, count in sorted(statuses[name].items())},
+            }
+        return {
+            'concurrency': self.concurrency,
+            'requests': len(samples),
+            'seconds': round(elapsed, 2),
+            'rps': round(len(samples) / elapsed, 1) if elapsed else 0,
+            'endpoints': endpoints,
+            'bookings_created': created,
+            'booking_conflicts': conflicts,
+            'double_bookings': self.double_bookings(),
+            'errors': errors,
+        }
+
+    def double_bookings(self):
+        """Пары активных пересекающихся бронирований на номерах теста в окне дат"""
+        window_end = self.window_start + timedelta(days=BOOKING_WINDOW_DAYS + 4)
+        found = []
+        for room_id in self.rooms:
+            query = urlencode({
+                'room': room_id, 'status': 'active', 'paginate': 'false', 'fields': 'id,check_in,check_out',
+                'date_from': self.window_start.date(), 'date_to': window_end.date(),
+            })
+            status, body = self.transport.request('GET', f'/api/bookings/?{query}')
+            if status != 200:
+                raise LoadTestError(f'Не удалось проверить бронирования номера {room_id} ({status})')
+            items = sorted(_results(body), key=lambda item: item['check_in'])
+            for previous, item in zip(items, items[1:]):
+                if parse_datetime(item['check_in']) < parse_datetime(previous['check_out']):
+                    found.append({'room': room_id, 'bookings': [previous['id'], item['id']]})
+        self.transport.close()
+        return found
+
+    def cleanup(self, booking_ids):
+        """Удаляет созданные тестом бронирования (через корзину, нужны права администратора)"""
+        failed = 0
+        for booking_id in booking_ids:
+            status, _ = self.transport.request('POST', f'/api/trash/delete/bookings/{booking_id}/', {})
+            failed += status != 200
+        self.transport.close()
+        return failed
+
+
+def parse_mix(value):
+    """'dashboard=3,search=4' -> {'dashboard': 3, 'search': 4}"""
+    mix = {}
+    for part in filter(None, (item.strip() for item in value.split(','))):
+        name, _, weight = part.partition('=')
+        try:
+            mix[name.strip()] = float(weight) if weight else 1.0
+        except ValueError:
+            raise LoadTestError(f'Некорректный вес сценария: {part}')
+    return mix
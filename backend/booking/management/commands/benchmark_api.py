@@ -0,0 +1,62 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from booking import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет все эндпоинты /api/, валидаторы и management-команды на демо-данных нескольких масштабов. '
+        'Данные создаются в транзакции, которая откатывается; отчёт можно сохранить в JSON и сравнить с прошлым.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', action='append',
+            help=f"Масштаб: {', '.join(benchmarks.SCALES)}, {benchmarks.EXISTING} (текущая база) "
+                 "или корпуса:номера:гости:бронирования; можно несколько (по умолчанию small)"
+        )
+        parser.add_argument('--repeat', type=int, default=5, help='Повторов каждого замера (плюс один прогрев)')
+        parser.add_argument('--seed', type=int, default=42, help='Seed генератора данных')
+        parser.add_argument('--output', type=str, help='Сохранить отчёт в JSON-файл')
+        parser.add_argument('--baseline', type=str, help='JSON-отчёт прошлого релиза для сравнения медиан')
+
+    def handle(self, *args, **options):
+        scales = options['scale'] or ['small']
+        baseline = None
+        try:
+            for scale in scales:
+                benchmarks.parse_scale(scale)
+            if options['baseline']:
+                with open(options['baseline'], encoding='utf-8') as f:
+                    baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        try:
+            report = benchmarks.report(
+                scales, repeat=options['repeat'], seed=options['seed'],
+                log=lambda message: self.stderr.write(message) if options['verbosity'] > 1 else None,
+            )
+        except benchmarks.BenchmarkError as e:
+            raise CommandError(str(e))
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Отчёт сохранён: {options['output']}"))
+
+        rows = benchmarks.compare(report, baseline) if baseline else [(row, None, None) for row in report['results']]
+        self.stdout.write(
+            f'{"Масштаб":<16}{"Группа":<10}{"Замер":<24}{"статус":>7}{"SQL":>6}'
+            f'{"мин, мс":>10}{"медиана":>10}{"p95":>10}' + (f'{"было":>10}{"изм., %":>9}' if baseline else '')
+        )
+        for row, old, change in rows:
+            line = (
+                f'{row["scale"][:15]:<16}{row["group"]:<10}{row["name"]:<24}{row.get("status", ""):>7}{row["queries"]:>6}'
+                f'{row["min_ms"]:>10.1f}{row["median_ms"]:>10.1f}{row["p95_ms"]:>10.1f}'
+            )
+            if baseline:
+                line += f'{old:>10.1f}{change:>+9.1f}' if old is not None else f'{"-":>10}{"-":>9}'
+            self.stdout.write(self.style.WARNING(line) if change is not None and change >= 20 else line)
@@ -0,0 +1,141 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from booking.models import Building, Room, Guest, Booking, AuditLog
+
+
+# Индексы миграций 0005-0007, которые снимаются для замера «до»
+BENCHMARK_INDEXES = [
+    'booking_room_active_dates_idx',
+    'booking_guest_payment_idx',
+    'booking_check_in_idx',
+    'auditlog_timestamp_idx',
+    'auditlog_object_idx',
+    'guest_phone_idx',
+    'guest_inn_idx',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает планы и время горячих запросов с индексами и без них на сгенерированных данных. '
+        'Всё выполняется в транзакции, которая откатывается; запускать только на тестовой базе.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=500, help='Количество номеров')
+        parser.add_argument('--guests', type=int, default=10000, help='Количество гостей')
+        parser.add_argument('--bookings', type=int, default=50000, help='Количество бронирований')
+        parser.add_argument('--repeat', type=int, default=20, help='Повторов каждого запроса')
+        parser.add_argument('--seed', type=int, default=42, help='Seed генератора данных')
+        parser.add_argument('--plans', action='store_true', help='Печатать планы запросов (EXPLAIN)')
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+        self.show_plans = options['plans']
+        with transaction.atomic():
+            self.stdout.write('Генерация данных...')
+            sample = self.generate(options['rooms'], options['guests'], options['bookings'], options['seed'])
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+            queries = self.hot_queries(sample)
+            after = self.measure(queries)
+
+            with connection.cursor() as cursor:
+                for name in BENCHMARK_INDEXES:
+                    cursor.execute(f'DROP INDEX IF EXISTS {connection.ops.quote_name(name)}')
+                cursor.execute('ANALYZE')
+            before = self.measure(queries)
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'\n{"Запрос":<28}{"без индексов, мс":>18}{"с индексами, мс":>18}{"ускорение":>12}')
+        for name, _ in queries:
+            speedup = before[name]['ms'] / after[name]['ms'] if after[name]['ms'] else 0
+            self.stdout.write(
+                f'{name:<28}{before[name]["ms"]:>18.3f}{after[name]["ms"]:>18.3f}{speedup:>11.1f}x'
+            )
+            if self.show_plans:
+                self.stdout.write(f'  до:    {before[name]["plan"]}')
+                self.stdout.write(f'  после: {after[name]["plan"]}')
+
+    def generate(self, rooms_count, guests_count, bookings_count, seed):
+        rnd = random.Random(seed)
+        buildings = Building.objects.bulk_create(
+            [Building(name=f'Корпус {i + 1}', address='Чолпон-Ата') for i in range(max(1, rooms_count // 100))]
+        )
+        rooms = Room.objects.bulk_create([
+            Room(
+                building=buildings[i % len(buildings)], number=str(100 + i), capacity=rnd.randint(1, 4),
+                room_type='Стандарт', price_per_night=Decimal(rnd.choice([1500, 2500, 4000])),
+            )
+            for i in range(rooms_count)
+        ])
+        guests = Guest.objects.bulk_create([
+            Guest(
+                full_name=f'Гость {i}', phone=f'+996700{i:06d}',
+                inn=f'{rnd.randint(10 ** 13, 10 ** 14 - 1)}' if i % 3 else '',
+            )
+            for i in range(guests_count)
+        ])
+        now = timezone.now()
+        bookings = []
+        for i in range(bookings_count):
+            check_in = now - timedelta(days=rnd.randint(-60, 720), hours=rnd.randint(0, 23))
+            bookings.append(Booking(
+                guest=guests[rnd.randrange(guests_count)], room=rooms[rnd.randrange(rooms_count)],
+                check_in=check_in, check_out=check_in + timedelta(days=rnd.randint(1, 10)),
+                people_count=1, status=rnd.choice(['active', 'completed', 'completed', 'cancelled']),
+                payment_status=rnd.choice(['paid', 'pending', 'unpaid']),
+                total_amount=Decimal(rnd.randint(1, 30) * 1000), is_deleted=rnd.random() < 0.05,
+            ))
+        Booking.objects.bulk_create(bookings, batch_size=5000)
+        AuditLog.objects.bulk_create([
+            AuditLog(action='Изменение', object_type='Booking', object_id=rnd.randint(1, bookings_count), details='')
+            for _ in range(bookings_count)
+        ], batch_size=5000)
+        return {'room': rooms[0], 'guest': guests[0], 'now': now}
+
+    def hot_queries(self, sample):
+        room, guest, now = sample['room'], sample['guest'], sample['now']
+        return [
+            # BookingSerializer.validate: пересечение интервалов
+            ('booking_overlap', lambda: Booking.objects.filter(
+                room=room, status='active', is_deleted=False,
+                check_in__lt=now + timedelta(days=3), check_out__gt=now,
+            ).values('id')[:1]),
+            # Room.update_status
+            ('room_update_status', lambda: room.bookings.filter(status='active', is_deleted=False).values('id')[:1]),
+            # GuestSerializer.get_total_spent / guest_paid_total
+            ('guest_total_spent', lambda: Booking.objects.filter(
+                guest=guest, payment_status='paid', is_deleted=False,
+            ).values('guest').annotate(total=Sum('total_amount'))),
+            # BookingViewSet.list: первая страница курсора
+            ('booking_list_page', lambda: Booking.objects.filter(is_deleted=False).order_by('-check_in', '-id')[:50]),
+            # AuditLogViewSet.list: первая страница курсора
+            ('auditlog_list_page', lambda: AuditLog.objects.order_by('-timestamp', '-id')[:50]),
+            ('auditlog_object_history', lambda: AuditLog.objects.filter(object_type='Booking', object_id=1)),
+            ('guest_by_phone', lambda: Guest.objects.filter(phone=guest.phone)),
+            ('guest_by_inn', lambda: Guest.objects.filter(inn='12345678901234')),
+        ]
+
+    def measure(self, queries):
+        results = {}
+        for name, build in queries:
+            timings = []
+            for _ in range(self.repeat):
+                started = time.perf_counter()
+                list(build())
+                timings.append((time.perf_counter() - started) * 1000)
+            plan = ' | '.join(line.strip() for line in build().explain().splitlines()) if self.show_plans else ''
+            results[name] = {'ms': statistics.median(timings), 'plan': plan}
+        return results
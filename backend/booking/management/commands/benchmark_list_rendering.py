@@ -0,0 +1,106 @@
+import json
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from booking.fast_list import transformer
+from booking.models import Building, Room, Guest, Booking, AuditLog
+from booking.renderers import ORJSONRenderer
+from booking.serializers import BookingSerializer, RoomSerializer, GuestSerializer, AuditLogSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает скорость списков: ModelSerializer + JSONRenderer против values() + RowTransformer + orjson '
+        '(строк в секунду). Данные генерируются в транзакции, которая откатывается.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000, help='Строк в каждом списке')
+        parser.add_argument('--repeat', type=int, default=5, help='Повторов каждого замера')
+        parser.add_argument('--seed', type=int, default=42, help='Seed генератора данных')
+        parser.add_argument('--json', action='store_true', help='Вывести результат в JSON')
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+        with transaction.atomic():
+            self.generate(options['rows'], options['seed'])
+            endpoints = [
+                ('bookings', Booking.objects.filter(is_deleted=False).select_related('guest', 'room__building'), BookingSerializer),
+                ('rooms', Room.objects.filter(is_deleted=False).select_related('building'), RoomSerializer),
+                ('guests', Guest.objects.filter(is_deleted=False), GuestSerializer),
+                ('audit_log', AuditLog.objects.all(), AuditLogSerializer),
+            ]
+            results = []
+            for name, queryset, serializer_class in endpoints:
+                queryset = queryset.order_by('-id')
+                rows = transformer(serializer_class)
+                serializer = self.measure(lambda: JSONRenderer().render(serializer_class(queryset, many=True).data))
+                fast = self.measure(lambda: ORJSONRenderer().render(
+                    rows.transform_many(queryset.values(*rows.columns))
+                ))
+                count = queryset.count()
+                results.append({
+                    'endpoint': name,
+                    'rows': count,
+                    'serializer_rows_per_sec': round(count / serializer),
+                    'fast_rows_per_sec': round(count / fast),
+                    'speedup': round(serializer / fast, 2),
+                })
+            transaction.set_rollback(True)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, ensure_ascii=False, indent=2))
+            return
+        self.stdout.write(f'{"Список":<12}{"строк":>8}{"сериализатор, стр/с":>22}{"быстрый, стр/с":>18}{"ускорение":>12}')
+        for row in results:
+            self.stdout.write(
+                f'{row["endpoint"]:<12}{row["rows"]:>8}{row["serializer_rows_per_sec"]:>22}'
+                f'{row["fast_rows_per_sec"]:>18}{row["speedup"]:>11.2f}x'
+            )
+
+    def measure(self, func):
+        timings = []
+        for _ in range(self.repeat):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings)
+
+    def generate(self, count, seed):
+        rnd = random.Random(seed)
+        buildings = Building.objects.bulk_create(
+            [Building(name=f'Корпус {i + 1}', address='Чолпон-Ата') for i in range(max(1, count // 100))]
+        )
+        rooms = Room.objects.bulk_create([
+            Room(
+                building=buildings[i % len(buildings)], number=str(100 + i), capacity=rnd.randint(1, 4),
+                room_type='Стандарт', price_per_night=Decimal(rnd.choice([1500, 2500, 4000])),
+            )
+            for i in range(count)
+        ])
+        guests = Guest.objects.bulk_create([
+            Guest(full_name=f'Гость {i}', phone=f'+996700{i:06d}') for i in range(count)
+        ])
+        now = timezone.now()
+        bookings = []
+        for i in range(count):
+            check_in = now - timedelta(days=rnd.randint(-60, 720), hours=rnd.randint(0, 23))
+            bookings.append(Booking(
+                guest=guests[i], room=rooms[rnd.randrange(count)],
+                check_in=check_in, check_out=check_in + timedelta(days=rnd.randint(1, 10)),
+                people_count=1, payment_status=rnd.choice(['paid', 'pending', 'unpaid']),
+                total_amount=Decimal(rnd.randint(1, 30) * 1000),
+            ))
+        Booking.objects.bulk_create(bookings, batch_size=5000)
+        AuditLog.objects.bulk_create([
+            AuditLog(action='Изменение', object_type='Booking', object_id=i, details='Бронирование изменено')
+            for i in range(count)
+        ], batch_size=5000)
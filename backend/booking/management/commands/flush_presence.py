@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from booking import presence, shared_cache
+
+
+class Command(BaseCommand):
+    help = 'Переносит активность сотрудников из кэша в поле last_seen'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', type=int, default=0, help='Повторять каждые N секунд (0 - один раз)')
+
+    def handle(self, *args, **options):
+        if not shared_cache.is_shared():
+            # Кэш команды пуст: активность хранится в памяти веб-процессов, их фоновый поток сам сохраняет last_seen
+            raise CommandError(
+                'Нужен общий кэш (Redis, Memcached): с кэшем процесса last_seen сохраняют сами веб-процессы'
+            )
+        interval = options['loop']
+        while True:
+            updated = presence.flush()
+            self.stdout.write(self.style.SUCCESS(f'Обновлено last_seen: {updated}'))
+            if not interval:
+                break
+            time.sleep(interval)
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from booking import demo_data
+from booking.models import Building, Room, Guest, Booking
+
+
+class Command(BaseCommand):
+    help = 'Создаёт демо-данные (корпуса, номера, гости, бронирования) заданного объёма через bulk_create'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buildings', type=int, default=10, help='Количество корпусов')
+        parser.add_argument('--rooms', type=int, default=2000, help='Количество номеров')
+        parser.add_argument('--guests', type=int, default=200000, help='Количество гостей')
+        parser.add_argument('--bookings', type=int, default=1000000, help='Количество бронирований')
+        parser.add_argument('--seed', type=int, default=42, help='Seed генератора данных')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Размер пачки bulk_create')
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Удалить все существующие корпуса, номера, гостей и бронирования перед генерацией'
+        )
+
+    def handle(self, *args, **options):
+        if options['buildings'] < 1 or options['rooms'] < options['buildings']:
+            raise CommandError('Нужен хотя бы один корпус и не меньше номеров, чем корпусов')
+        if options['bookings'] and not options['guests']:
+            raise CommandError('Для бронирований нужны гости')
+
+        started = time.perf_counter()
+        with transaction.atomic():
+            if options['clear']:
+                tables = [model._meta.db_table for model in (Booking, Guest, Room, Building)]
+                connection.ops.execute_sql_flush(connection.ops.sql_flush(no_style(), tables, reset_sequences=True))
+                self.stdout.write('Существующие данные удалены')
+            counts = demo_data.generate(
+                buildings=options['buildings'],
+                rooms=options['rooms'],
+                guests=options['guests'],
+                bookings=options['bookings'],
+                seed=options['seed'],
+                batch_size=options['batch_size'],
+                log=self.stdout.write,
+            )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Создано: корпусов {counts['buildings']}, номеров {counts['rooms']}, гостей {counts['guests']}, "
+            f"бронирований {counts['bookings']} за {elapsed:.1f} с"
+        ))
@@ -0,0 +1,46 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from booking.importer import import_bookings, parse_rows, ImportFormatError
+from booking.models import User
+
+
+class Command(BaseCommand):
+    help = 'Массовый импорт бронирований и гостей из CSV или JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str, help='Путь к файлу .csv или .json')
+        parser.add_argument('--format', choices=['csv', 'json'], help='Формат (по умолчанию по расширению)')
+        parser.add_argument('--user', type=str, help='Сотрудник, от имени которого создаются бронирования')
+        parser.add_argument('--partial', action='store_true', help='Сохранить корректные строки, даже если есть ошибки')
+        parser.add_argument('--dry-run', action='store_true', help='Только проверить файл')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.lower().endswith('.csv') else 'json')
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"Пользователь {options['user']} не найден")
+
+        try:
+            with open(path, 'rb') as f:
+                rows = parse_rows(f.read(), fmt)
+        except (OSError, ImportFormatError) as e:
+            raise CommandError(str(e))
+
+        started = time.perf_counter()
+        report = import_bookings(rows, user=user, partial=options['partial'], dry_run=options['dry_run'])
+        elapsed = (time.perf_counter() - started) * 1000
+
+        for error in report['errors']:
+            self.stdout.write(self.style.ERROR(
+                f"Строка {error['row']}: {json.dumps(error['errors'], ensure_ascii=False)}"
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f"Строк: {len(rows)}, создано бронирований: {report['created']}, "
+            f"новых гостей: {report['guests_created']}, ошибок: {len(report['errors'])} за {elapsed:.0f} мс"
+        ))
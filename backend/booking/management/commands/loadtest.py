@@ -0,0 +1,112 @@
+import json
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from booking.loadtest import DEFAULT_MIX, HttpTransport, InProcessTransport, LoadTest, LoadTestError, parse_mix
+from booking.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест: смесь запросов (сводка, шахматка, поиск гостя, создание бронирования) из пула потоков '
+        'в приложение этого процесса или на локальный сервер (--url). Отчёт: запросы в секунду и p50/p95/p99 '
+        'по эндпоинтам, отказы из-за пересечений и двойные бронирования. Работает без доступа в интернет.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', type=str, help='Адрес запущенного сервера, например http://127.0.0.1:8000')
+        parser.add_argument('--token', type=str, help='JWT access-токен для --url')
+        parser.add_argument('--username', type=str, help='Логин для получения токена (--url) или сотрудник (без --url)')
+        parser.add_argument('--password', type=str, help='Пароль для получения токена (--url)')
+        parser.add_argument('--concurrency', type=int, default=10, help='Число параллельных клиентов (потоков)')
+        parser.add_argument('--requests', type=int, default=500, help='Всего запросов (0 - без ограничения)')
+        parser.add_argument('--duration', type=float, help='Ограничение по времени, секунд')
+        parser.add_argument(
+            '--mix', type=str, default=','.join(f'{name}={weight}' for name, weight in DEFAULT_MIX.items()),
+            help='Смесь сценариев с весами: dashboard, calendar, search, booking, available, bookings'
+        )
+        parser.add_argument('--rooms', type=int, default=10, help='Сколько номеров бронировать (меньше - больше конкуренции)')
+        parser.add_argument('--seed', type=int, default=42, help='Seed выбора сценариев и данных')
+        parser.add_argument('--keep', action='store_true', help='Не удалять созданные тестом бронирования')
+        parser.add_argument('--json', action='store_true', help='Вывести отчёт в JSON')
+
+    def handle(self, *args, **options):
+        if not options['requests'] and not options['duration']:
+            raise CommandError('Укажите --requests или --duration')
+        try:
+            transport = self.transport(options)
+            test = LoadTest(
+                transport, mix=parse_mix(options['mix']), concurrency=options['concurrency'],
+                requests=options['requests'], duration=options['duration'], room_pool=options['rooms'],
+                seed=options['seed'],
+            )
+            # Ожидаемые отказы 4xx (пересечения дат) не засоряют вывод предупреждениями django.request
+            request_logger = logging.getLogger('django.request')
+            level = request_logger.level
+            request_logger.setLevel(logging.ERROR)
+            try:
+                report = test.run()
+                if not options['keep']:
+                    report['cleanup_failed'] = test.cleanup(report['bookings_created'])
+            finally:
+                request_logger.setLevel(level)
+        except LoadTestError as e:
+            raise CommandError(str(e))
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+        else:
+            self.print_report(report)
+
+        server_errors = [error for error in report['errors'] if error['status'] == 0 or error['status'] >= 500]
+        if report['double_bookings'] or server_errors:
+            raise CommandError(
+                f"Двойных бронирований: {len(report['double_bookings'])}, ошибок сервера: {len(server_errors)}"
+            )
+
+    def transport(self, options):
+        if options['url']:
+            if not options['token'] and not (options['username'] and options['password']):
+                raise CommandError('Для --url нужен --token или --username и --password')
+            return HttpTransport(options['url'], options['token'], options['username'], options['password'])
+        users = User.objects.filter(is_active=True)
+        if options['username']:
+            user = users.filter(username=options['username']).first()
+            if user is None:
+                raise CommandError(f"Пользователь {options['username']} не найден")
+        else:
+            # Удаление созданных бронирований через корзину требует прав администратора
+            user = users.filter(is_staff=True).order_by('id').first()
+            if user is None:
+                raise CommandError('Нет активного сотрудника с is_staff: создайте его или укажите --username')
+        return InProcessTransport(user)
+
+    def print_report(self, report):
+        self.stdout.write(
+            f"Клиентов: {report['concurrency']}, запросов: {report['requests']} за {report['seconds']} с "
+            f"({report['rps']} в секунду)"
+        )
+        self.stdout.write(
+            f'{"Эндпоинт":<12}{"запросов":>10}{"в сек.":>9}{"p50, мс":>10}{"p95":>9}{"p99":>9}{"max":>9}  статусы'
+        )
+        for name, row in report['endpoints'].items():
+            statuses = ', '.join(f'{status}: {count}' for status, count in row['statuses'].items())
+            self.stdout.write(
+                f'{name:<12}{row["requests"]:>10}{row["rps"]:>9}{row["p50_ms"]:>10}{row["p95_ms"]:>9}'
+                f'{row["p99_ms"]:>9}{row["max_ms"]:>9}  {statuses}'
+            )
+        self.stdout.write(
+            f"Создано бронирований: {len(report['bookings_created'])}, "
+            f"отказов из-за пересечения дат: {report['booking_conflicts']}"
+        )
+        if report.get('cleanup_failed'):
+            self.stdout.write(self.style.WARNING(f"Не удалось удалить бронирований: {report['cleanup_failed']}"))
+        for error in report['errors'][:20]:
+            self.stdout.write(self.style.ERROR(f"{error['endpoint']}: {error['status']} {error['body']}"))
+        for item in report['double_bookings']:
+            self.stdout.write(self.style.ERROR(
+                f"Двойное бронирование номера {item['room']}: #{item['bookings'][0]} и #{item['bookings'][1]}"
+            ))
+        if not report['errors'] and not report['double_bookings']:
+            self.stdout.write(self.style.SUCCESS('Ошибок и двойных бронирований нет'))
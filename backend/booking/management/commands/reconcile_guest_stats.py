@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from booking import guest_stats
+from booking.models import Guest
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает total_spent и visits_count гостей по бронированиям и выводит расхождения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Только показать расхождения')
+        parser.add_argument('--guest', type=int, action='append', help='Только указанные гости (id, можно несколько)')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        with transaction.atomic():
+            drift = guest_stats.recompute(options['guest'], dry_run=options['dry_run'])
+        elapsed = (time.perf_counter() - started) * 1000
+
+        for guest_id, old_spent, new_spent, old_visits, new_visits in drift:
+            self.stdout.write(
+                f'Гость #{guest_id}: сумма {old_spent} → {new_spent}, визиты {old_visits} → {new_visits}'
+            )
+
+        total = Guest.objects.filter(id__in=options['guest']).count() if options['guest'] else Guest.objects.count()
+        prefix = '[dry-run] ' if options['dry_run'] else ''
+        style = self.style.WARNING if drift else self.style.SUCCESS
+        self.stdout.write(style(f'{prefix}Расхождений: {len(drift)} из {total} гостей за {elapsed:.1f} мс'))
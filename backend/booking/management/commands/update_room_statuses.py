@@ -1,27 +1,82 @@
+import logging
+import time
+
 from django.core.management.base import BaseCommand
-from booking.models import Room
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from booking import audit, events, room_status
+from booking.models import Room, Booking
+
+logger = logging.getLogger(__name__)
 
 
 class Command(BaseCommand):
-    help = 'Обновляет статусы всех номеров на основе активных бронирований'
+    help = (
+        'Завершает бронирования с прошедшей датой выезда и обновляет статусы всех номеров '
+        'на основе активных бронирований'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Показать изменения без сохранения')
+        parser.add_argument('--building', type=int, help='Только номера указанного корпуса (id)')
+        parser.add_argument(
+            '--every', type=int, default=0,
+            help='Запускать каждые N секунд в этом процессе (без cron); 0 - один раз'
+        )
 
     def handle(self, *args, **options):
+        interval = options['every']
+        while True:
+            try:
+                self.run_once(options['dry_run'], options['building'])
+            except Exception as e:
+                if not interval:
+                    raise
+                logger.error(f"Ошибка обновления статусов номеров: {str(e)}")
+            if not interval:
+                break
+            close_old_connections()
+            time.sleep(interval)
+
+    def run_once(self, dry_run, building_id):
+        started = time.perf_counter()
+        now = timezone.now()
+
+        bookings = Booking.objects.filter(status='active', is_deleted=False, check_out__lte=now)
         rooms = Room.objects.filter(is_deleted=False)
-        updated_count = 0
-        
-        for room in rooms:
-            old_status = room.status
-            room.update_status()
-            if old_status != room.status:
-                updated_count += 1
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        f'Номер {room.number}: {old_status} → {room.status}'
+        if building_id:
+            bookings = bookings.filter(room__building_id=building_id)
+            rooms = rooms.filter(building_id=building_id)
+
+        with transaction.atomic():
+            expired = list(bookings.values_list('id', flat=True))
+            if expired:
+                Booking.objects.filter(id__in=expired).update(status='completed')
+                for booking_id in expired:
+                    audit.log(
+                        user=None,
+                        action='Изменение',
+                        object_type='Booking',
+                        object_id=booking_id,
+                        details='Бронирование завершено автоматически: дата выезда прошла'
                     )
-                )
-        
+                # update() не вызывает сигналы: клиентам публикуются завершённые бронирования
+                for booking in Booking.objects.filter(id__in=expired).select_related('guest'):
+                    events.publish_booking(booking)
+            changes = room_status.recompute(rooms=rooms)
+            # В режиме dry-run всё выполняется, но транзакция откатывается вместе с журналом
+            if dry_run:
+                transaction.set_rollback(True)
+
+        elapsed = (time.perf_counter() - started) * 1000
+        for room_id, old_status, new_status in changes:
+            self.stdout.write(f'Номер #{room_id}: {old_status} → {new_status}')
+
+        prefix = '[dry-run] ' if dry_run else ''
         self.stdout.write(
             self.style.SUCCESS(
-                f'Обновлено статусов: {updated_count} из {rooms.count()} номеров'
+                f'{prefix}Завершено бронирований: {len(expired)}, '
+                f'обновлено статусов: {len(changes)} из {rooms.count()} номеров за {elapsed:.1f} мс'
             )
-        ) 
\ No newline at end of file
+        )
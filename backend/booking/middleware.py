@@ -1,46 +1,221 @@
-from django.utils import timezone
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
 from django.http import JsonResponse
 from django.conf import settings
-from .models import User
+from django.db import connections
+from contextlib import ExitStack
+from time import perf_counter
+from . import audit, performance, presence
+import json
 import logging
+import random
 import traceback
 
 logger = logging.getLogger(__name__)
+performance_logger = logging.getLogger('booking.performance')
+
+
+class AsyncCapableMiddleware:
+    """
+    Основа для middleware, которые работают и под WSGI, и под ASGI без перехода в поток:
+    в async-цепочке __call__ возвращает корутину __acall__.
+    """
+    sync_capable = True
+    async_capable = True
 
-class UserActivityMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        # Обновляем last_seen для аутентифицированного пользователя
-        if request.user.is_authenticated and hasattr(request.user, 'last_seen'):
-            request.user.last_seen = timezone.now()
-            request.user.save(update_fields=['last_seen'])
-        
+        if self.is_async:
+            return self.__acall__(request)
+        return self.handle(request)
+
+class PerformanceMiddleware(AsyncCapableMiddleware):
+    """
+    Замеряет запрос: число и время SQL-запросов, сериализацию, рендеринг, самые медленные запросы.
+    Результат отдаётся в заголовке Server-Timing; медленные запросы и повторы SQL (N+1)
+    пишутся в лог booking.performance одной JSON-строкой.
+    Подробно замеряется доля PERFORMANCE_SAMPLE_RATE запросов, у остальных - только общее время.
+    Server-Timing раскрывает устройство запросов к БД, поэтому по умолчанию отдаётся
+    только сотрудникам с is_staff (PERFORMANCE_SERVER_TIMING = 'staff'; 'all' - всем, 'off' - никому).
+    """
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.enabled = getattr(settings, 'PERFORMANCE_MONITORING', True)
+        self.sample_rate = getattr(settings, 'PERFORMANCE_SAMPLE_RATE', 0.05)
+        self.slow_ms = getattr(settings, 'PERFORMANCE_SLOW_REQUEST_MS', 500)
+        self.repeated_threshold = getattr(settings, 'PERFORMANCE_REPEATED_QUERIES', 10)
+        self.slow_queries = getattr(settings, 'PERFORMANCE_SLOW_QUERIES', 5)
+        self.server_timing = getattr(settings, 'PERFORMANCE_SERVER_TIMING', 'staff')
+
+    def handle(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+        started = perf_counter()
+        if not self._sampled():
+            return self._unsampled(request, self.get_response(request), started)
+
+        metrics, token = performance.start(self.slow_queries)
+        try:
+            with self._wrap_connections(metrics):
+                response = self.get_response(request)
+        finally:
+            performance.stop(token)
+        return self._finish(request, response, metrics, started)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        started = perf_counter()
+        if not self._sampled():
+            return self._unsampled(request, await self.get_response(request), started)
+
+        metrics, token = performance.start(self.slow_queries)
+        try:
+            # ORM из async-кода выполняется в потоке запроса (sync_to_async): обёртки SQL
+            # ставятся на соединения этого потока, а не event loop
+            wrappers = await sync_to_async(self._wrap_connections)(metrics)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(wrappers.close)()
+        finally:
+            performance.stop(token)
+        return self._finish(request, response, metrics, started)
+
+    def _sampled(self):
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def _show_timing(self, request):
+        if self.server_timing in (True, 'all'):
+            return True
+        if self.server_timing == 'staff':
+            # Пользователь известен после ответа: DRF подставляет его в request
+            user = getattr(request, 'user', None)
+            return user is not None and user.is_authenticated and user.is_staff
+        return False
+
+    def _unsampled(self, request, response, started):
+        if self._show_timing(request):
+            response['Server-Timing'] = f'total;dur={(perf_counter() - started) * 1000:.1f}'
+        return response
+
+    @staticmethod
+    def _wrap_connections(metrics):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(metrics))
+        return stack
+
+    def _finish(self, request, response, metrics, started):
+        total_ms = (perf_counter() - started) * 1000
+
+        if self._show_timing(request):
+            parts = [f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries"']
+            parts += [f'{name};dur={duration * 1000:.1f}' for name, duration in metrics.timings.items()]
+            parts.append(f'total;dur={total_ms:.1f}')
+            response['Server-Timing'] = ', '.join(parts)
+
+        repeated_sql, repeated = metrics.most_repeated()
+        if total_ms >= self.slow_ms or repeated >= self.repeated_threshold:
+            match = getattr(request, 'resolver_match', None)
+            record = {
+                'event': 'slow_request' if total_ms >= self.slow_ms else 'repeated_queries',
+                'method': request.method,
+                'path': request.path,
+                'view': match.view_name if match else None,
+                'status': response.status_code,
+                'total_ms': round(total_ms, 1),
+                'db_ms': round(metrics.db_time * 1000, 1),
+                'queries': metrics.queries,
+                **{f'{name}_ms': round(duration * 1000, 1) for name, duration in metrics.timings.items()},
+                'repeated': {'count': repeated, 'sql': repeated_sql[:1000]} if repeated > 1 else None,
+                'slowest': metrics.slowest(),
+            }
+            performance_logger.warning(json.dumps(record, ensure_ascii=False))
+        return response
+
+    def process_template_response(self, request, response):
+        # Ответы DRF рендерятся после view: оборачиваем render, чтобы замерить его отдельно
+        if performance.current() is not None:
+            render = response.render
+
+            def timed_render():
+                with performance.timed('render'):
+                    return render()
+            response.render = timed_render
+        return response
+
+class UserActivityMiddleware(AsyncCapableMiddleware):
+    def handle(self, request):
         response = self.get_response(request)
+        user = self._active_user(request)
+        if user is not None:
+            presence.touch(user)
         return response
 
-class ErrorHandlingMiddleware:
-    def __init__(self, get_response):
-        self.get_response = get_response
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        user = self._active_user(request)
+        if user is not None:
+            await presence.atouch(user)
+        return response
 
-    def __call__(self, request):
+    @staticmethod
+    def _active_user(request):
+        # Отмечаем активность после ответа: к этому моменту DRF уже подставил JWT-пользователя.
+        # Запись идёт в кэш, в БД last_seen переносит фоновый поток presence.py
+        # Нужен только pk: у пользователя из claims JWT (TokenUser) остальные поля не загружаются
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated and user.pk is not None:
+            return user
+        return None
+
+class AuditBufferMiddleware(AsyncCapableMiddleware):
+    """Собирает записи журнала, сделанные вне транзакций, и сохраняет их одним запросом в конце запроса"""
+    def handle(self, request):
+        with audit.request_buffer():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        buffer = audit.request_buffer()
+        buffer.__enter__()
+        try:
+            return await self.get_response(request)
+        finally:
+            # Сохранение записей обращается к БД: выполняется в потоке
+            await sync_to_async(buffer.__exit__)(None, None, None)
+
+class ErrorHandlingMiddleware(AsyncCapableMiddleware):
+    def handle(self, request):
         try:
             response = self.get_response(request)
             return response
         except Exception as e:
-            logger.error(f"Unhandled exception in {request.path}: {str(e)}")
-            logger.error(f"Traceback: {traceback.format_exc()}")
-            
-            # Возвращаем JSON ошибку для API запросов
-            if request.path.startswith('/api/'):
-                return JsonResponse({
-                    'error': 'Internal server error',
-                    'detail': str(e) if settings.DEBUG else 'Something went wrong'
-                }, status=500)
-            
-            # Для обычных запросов возвращаем стандартную ошибку Django
-            raise
+            return self._error_response(request, e)
+
+    async def __acall__(self, request):
+        try:
+            return await self.get_response(request)
+        except Exception as e:
+            return self._error_response(request, e)
+
+    def _error_response(self, request, e):
+        logger.error(f"Unhandled exception in {request.path}: {str(e)}")
+        logger.error(f"Traceback: {traceback.format_exc()}")
+        
+        # Возвращаем JSON ошибку для API запросов
+        if request.path.startswith('/api/'):
+            return JsonResponse({
+                'error': 'Internal server error',
+                'detail': str(e) if settings.DEBUG else 'Something went wrong'
+            }, status=500)
+        
+        # Для обычных запросов возвращаем стандартную ошибку Django
+        raise
 
     def process_exception(self, request, exception):
         logger.error(f"Exception in {request.path}: {str(exception)}")
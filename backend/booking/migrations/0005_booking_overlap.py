@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:54
+
+from django.db import migrations, models
+
+OVERLAPS_SQL = (
+    'SELECT a.id, b.id FROM booking_booking a '
+    'JOIN booking_booking b ON b.room_id = a.room_id AND b.id > a.id '
+    'AND b.check_in < a.check_out AND a.check_in < b.check_out '
+    "WHERE a.status = 'active' AND NOT a.is_deleted "
+    "AND b.status = 'active' AND NOT b.is_deleted "
+    'ORDER BY a.id, b.id'
+)
+
+
+def find_overlaps(connection):
+    """Пары id активных бронирований, пересекающихся по номеру и датам"""
+    with connection.cursor() as cursor:
+        cursor.execute(OVERLAPS_SQL)
+        return cursor.fetchall()
+
+
+def add_overlap_constraint(apps, schema_editor):
+    # Исключающее ограничение есть только в PostgreSQL, на других БД проверка остаётся в сериализаторе
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    # Без проверки ADD CONSTRAINT упадёт на первом же пересечении, не назвав остальные
+    overlaps = find_overlaps(schema_editor.connection)
+    if overlaps:
+        pairs = ', '.join(f'{a}/{b}' for a, b in overlaps[:50])
+        more = f' и ещё {len(overlaps) - 50}' if len(overlaps) > 50 else ''
+        raise RuntimeError(
+            f'Найдены пересекающиеся активные бронирования (id/id): {pairs}{more}. '
+            'Отмените или перенесите их и повторите миграцию.'
+        )
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    schema_editor.execute(
+        'ALTER TABLE booking_booking ADD CONSTRAINT booking_no_overlap '
+        'EXCLUDE USING gist (room_id WITH =, tstzrange(check_in, check_out) WITH &&) '
+        "WHERE (status = 'active' AND NOT is_deleted)"
+    )
+
+
+def remove_overlap_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('ALTER TABLE booking_booking DROP CONSTRAINT IF EXISTS booking_no_overlap')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0004_alter_auditlog_options_alter_auditlog_action_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(condition=models.Q(('is_deleted', False), ('status', 'active')), fields=['room', 'check_in', 'check_out'], name='booking_room_active_dates_idx'),
+        ),
+        migrations.RunPython(add_overlap_constraint, remove_overlap_constraint),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0005_booking_overlap'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='room',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_deleted', False)), fields=['building', 'room_class', 'capacity'], name='room_available_search_idx'),
+        ),
+    ]
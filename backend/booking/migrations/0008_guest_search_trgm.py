@@ -0,0 +1,38 @@
+from django.db import migrations
+
+# GIN-индексы pg_trgm для подстрочного поиска гостей (booking/search.py).
+# Выражения совпадают с тем, что генерирует ORM: UPPER(full_name) LIKE UPPER(...) для icontains.
+GUEST_SEARCH_INDEXES = {
+    'guest_full_name_trgm_idx': 'UPPER(full_name) gin_trgm_ops',
+    'guest_phone_trgm_idx': 'phone gin_trgm_ops',
+    'guest_inn_trgm_idx': 'inn gin_trgm_ops',
+}
+
+
+def add_search_indexes(apps, schema_editor):
+    # Индексы pg_trgm есть только в PostgreSQL, на других БД поиск работает без них
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, expression in GUEST_SEARCH_INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON booking_guest USING gin ({expression}) WHERE NOT is_deleted'
+        )
+
+
+def remove_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in GUEST_SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0007_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_search_indexes, remove_search_indexes),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:14
+
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_guest_stats(apps, schema_editor):
+    # Раньше счётчики не велись: заполняем их одним UPDATE по существующим бронированиям
+    Guest = apps.get_model('booking', 'Guest')
+    Booking = apps.get_model('booking', 'Booking')
+    bookings = Booking.objects.filter(guest=OuterRef('pk'), is_deleted=False).order_by().values('guest')
+    paid = bookings.filter(payment_status='paid').annotate(total=Sum('total_amount')).values('total')
+    visits = bookings.exclude(status='cancelled').annotate(count=Count('id')).values('count')
+    output_field = DecimalField(max_digits=12, decimal_places=2)
+    Guest.objects.update(
+        total_spent=Coalesce(Subquery(paid, output_field=output_field), Value(0), output_field=output_field),
+        visits_count=Coalesce(Subquery(visits), Value(0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0008_guest_search_trgm'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='guest',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['total_spent', 'id'], name='guest_total_spent_idx'),
+        ),
+        migrations.RunPython(fill_guest_stats, migrations.RunPython.noop),
+    ]
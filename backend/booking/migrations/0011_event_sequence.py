@@ -0,0 +1,25 @@
+from django.db import migrations
+
+
+def create_event_sequence(apps, schema_editor):
+    # Номера событий PostgresBroker (booking/events.py); на других БД используется InProcessBroker
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE SEQUENCE IF NOT EXISTS booking_event_seq')
+
+
+def drop_event_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP SEQUENCE IF EXISTS booking_event_seq')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0010_token_user'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_event_sequence, drop_event_sequence),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0011_event_sequence'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='last_seen',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Последняя активность'),
+        ),
+    ]
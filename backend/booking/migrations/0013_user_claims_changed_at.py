@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:46
+
+import booking.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0012_alter_user_last_seen'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', booking.models.StaffManager()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='claims_changed_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True, verbose_name='Смена прав'),
+        ),
+    ]
@@ -1,9 +1,27 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
+from django.db.models import Sum, OuterRef, Subquery, Value, DecimalField
+from django.db.models.functions import Coalesce
 from phonenumber_field.modelfields import PhoneNumberField
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.utils import timezone
+from . import audit, events, guest_stats, response_cache, room_status
+
+class UserQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        # update() идёт мимо save() и сигналов: время смены claims ставится здесь (см. authentication.py)
+        from . import authentication
+        revoking = bool(authentication.REVOKING_FIELDS & kwargs.keys())
+        if revoking:
+            kwargs.setdefault('claims_changed_at', timezone.now())
+        rows = super().update(**kwargs)
+        if revoking:
+            authentication.forget()
+        return rows
+
+class StaffManager(UserManager.from_queryset(UserQuerySet)):
+    pass
 
 class User(AbstractUser):
     ROLE_CHOICES = [
@@ -13,20 +31,60 @@ class User(AbstractUser):
     role = models.CharField("Роль", max_length=20, choices=ROLE_CHOICES, default="admin")
     phone = PhoneNumberField("Телефон", blank=True, null=True)
     last_seen = models.DateTimeField("Последняя активность", default=timezone.now)
+    claims_changed_at = models.DateTimeField("Смена прав", null=True, blank=True, db_index=True, editable=False)
+
+    objects = StaffManager()
 
     def __str__(self):
         return f"{self.username} ({self.get_role_display()})"
 
+    def save(self, *args, **kwargs):
+        # Смена claims или блокировка отменяет claims выданных токенов (см. authentication.py)
+        from .authentication import REVOKING_FIELDS
+        loaded = getattr(self, '_loaded_claims', None)
+        if loaded is not None and loaded != {field: self.__dict__.get(field) for field in REVOKING_FIELDS}:
+            self.claims_changed_at = timezone.now()
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'claims_changed_at'}
+        super().save(*args, **kwargs)
+
     def is_online(self):
-        """Проверяет, онлайн ли пользователь (активен в последние 5 минут)"""
-        from django.utils import timezone
-        from datetime import timedelta
-        return self.last_seen >= timezone.now() - timedelta(minutes=5)
+        """Проверяет, онлайн ли пользователь (активен в последние 5 минут, с учётом кэша присутствия)"""
+        from . import presence
+        return presence.is_online(self)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Исходные claims JWT и is_active: их изменение отменяет claims выданных токенов (см. authentication.py)
+        from .authentication import REVOKING_FIELDS
+        instance._loaded_claims = {field: instance.__dict__.get(field) for field in REVOKING_FIELDS}
+        return instance
 
     class Meta:
         verbose_name = 'Сотрудник'
         verbose_name_plural = 'Сотрудники'
 
+class TokenUser(User):
+    """
+    Сотрудник из claims JWT (см. booking/authentication.py): загружены только поля из токена.
+    При обращении к любому другому полю все отложенные поля подставляются разом из кэша.
+    """
+    class Meta:
+        proxy = True
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        deferred = self.get_deferred_fields()
+        if fields and from_queryset is None and set(fields) <= deferred:
+            from .authentication import cached_user_values
+            values = cached_user_values(self.pk) or {}
+            for attname in deferred & values.keys():
+                setattr(self, attname, values[attname])
+            if set(fields) <= values.keys():
+                return
+        super().refresh_from_db(using, fields, from_queryset)
+
 class Building(models.Model):
     name = models.CharField(max_length=100, verbose_name="Название корпуса")
     address = models.CharField(max_length=255, verbose_name="Адрес")
@@ -63,26 +121,34 @@ class Room(models.Model):
     amenities = models.CharField(max_length=255, blank=True, verbose_name="Удобства (через запятую)")
     is_deleted = models.BooleanField(default=False, verbose_name="Удалён")
 
+    class Meta:
+        indexes = [
+            # Поиск свободных номеров: корпус, класс и вместимость среди действующих номеров
+            models.Index(
+                fields=['building', 'room_class', 'capacity'],
+                name='room_available_search_idx',
+                condition=models.Q(is_deleted=False, is_active=True),
+            ),
+        ]
+
     def __str__(self):
         return f"{self.building.name} - {self.number}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Исходный статус: его изменение публикуется событием room.status (см. events.py)
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
     def update_status(self):
         """Автоматически обновляет статус номера на основе активных бронирований"""
         if self.status == 'repair':
             return  # Если номер на ремонте, не меняем статус
-        
-        # Проверяем есть ли активные бронирования для этого номера
-        active_bookings = self.bookings.filter(
-            status='active',
-            is_deleted=False
-        )
-        
-        if active_bookings.exists():
-            self.status = 'busy'
-        else:
-            self.status = 'free'
-        
-        self.save(update_fields=['status'])
+
+        from . import room_status
+        for _, _, new_status in room_status.recompute([self.pk]):
+            self.status = new_status
 
     def soft_delete(self):
         self.is_deleted = True
@@ -92,6 +158,9 @@ class Room(models.Model):
         self.is_deleted = False
         self.save()
 
+# Денормализованная статистика гостя, которую поддерживает guest_stats
+GUEST_STATS_FIELDS = ('total_spent', 'visits_count')
+
 class Guest(models.Model):
     full_name = models.CharField(max_length=100, verbose_name="ФИО")
     phone = models.CharField(max_length=20, verbose_name="Телефон")
@@ -116,9 +185,30 @@ class Guest(models.Model):
     )
     is_deleted = models.BooleanField(default=False, verbose_name="Удалён")
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['phone'], name='guest_phone_idx'),
+            models.Index(fields=['inn'], name='guest_inn_idx'),
+            # Сортировка гостей по сумме оплат (VIP)
+            models.Index(
+                fields=['total_spent', 'id'],
+                name='guest_total_spent_idx',
+                condition=models.Q(is_deleted=False),
+            ),
+        ]
+
     def __str__(self):
         return self.full_name
 
+    def save(self, *args, **kwargs):
+        # Статистику ведёт guest_stats через F(); обычное сохранение не перезаписывает её устаревшими значениями
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in GUEST_STATS_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
     def soft_delete(self):
         self.is_deleted = True
         self.save()
@@ -127,6 +217,9 @@ class Guest(models.Model):
         self.is_deleted = False
         self.save()
 
+# Имя исключающего ограничения PostgreSQL на пересечение активных бронирований (миграция 0005)
+BOOKING_OVERLAP_CONSTRAINT = 'booking_no_overlap'
+
 class Booking(models.Model):
     guest = models.ForeignKey(Guest, on_delete=models.CASCADE, related_name="bookings", verbose_name="Гость")
     room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name="bookings", verbose_name="Комната")
@@ -168,9 +261,42 @@ class Booking(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создано")
     is_deleted = models.BooleanField(default=False, verbose_name="Удалён")
 
+    class Meta:
+        indexes = [
+            # Поиск пересечений: room = X AND check_in < Y AND check_out > Z среди активных
+            models.Index(
+                fields=['room', 'check_in', 'check_out'],
+                name='booking_room_active_dates_idx',
+                condition=models.Q(status='active', is_deleted=False),
+            ),
+            # Сумма оплаченных бронирований гостя (total_spent)
+            models.Index(
+                fields=['guest', 'payment_status'],
+                name='booking_guest_payment_idx',
+                condition=models.Q(is_deleted=False),
+            ),
+            # Список бронирований и курсор: ORDER BY check_in DESC, id DESC; отчёты по дате заезда
+            models.Index(
+                fields=['check_in', 'id'],
+                name='booking_check_in_idx',
+                condition=models.Q(is_deleted=False),
+            ),
+        ]
+
     def __str__(self):
         return f"{self.guest.full_name} - {self.room} ({self.check_in} - {self.check_out})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем исходный номер, чтобы при переносе брони пересчитать и его статус
+        instance._loaded_room_id = instance.__dict__.get('room_id')
+        # и исходный вклад в статистику гостя
+        instance._loaded_guest_stats = guest_stats.snapshot(instance)
+        # и исходный статус: отмена публикуется отдельным событием (см. events.py)
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
     def save(self, *args, **kwargs):
         # Автоматически рассчитываем общую сумму на основе цены номера и количества дней
         if self.room and self.check_in and self.check_out:
@@ -178,11 +304,8 @@ class Booking(models.Model):
             days = (self.check_out - self.check_in).days
             self.total_amount = self.room.price_per_night * days
         
-        # Сохраняем бронирование
+        # Сохраняем бронирование; статус номера пересчитает сигнал после коммита
         super().save(*args, **kwargs)
-        
-        # Обновляем статус номера
-        self.room.update_status()
 
     @property
     def date_from(self):
@@ -202,6 +325,16 @@ class Booking(models.Model):
         self.is_deleted = False
         self.save()
 
+def guest_paid_total(guest_ref='pk'):
+    """Подзапрос: сумма оплаченных бронирований гостя (для annotate вместо запроса на каждую строку)"""
+    paid = Booking.objects.filter(
+        guest=OuterRef(guest_ref),
+        payment_status='paid',
+        is_deleted=False
+    ).order_by().values('guest').annotate(total=Sum('total_amount')).values('total')
+    output_field = DecimalField(max_digits=12, decimal_places=2)
+    return Coalesce(Subquery(paid, output_field=output_field), Value(0), output_field=output_field)
+
 class AuditLog(models.Model):
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, verbose_name="Пользователь")
     action = models.CharField(max_length=50, verbose_name="Действие")
@@ -212,25 +345,52 @@ class AuditLog(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # Журнал и курсор: ORDER BY timestamp DESC, id DESC
+            models.Index(fields=['timestamp', 'id'], name='auditlog_timestamp_idx'),
+            # История конкретного объекта
+            models.Index(fields=['object_type', 'object_id'], name='auditlog_object_idx'),
+        ]
 
 # Сигналы для автоматического обновления статусов номеров
 @receiver(post_save, sender=Booking)
 def update_room_status_on_booking_save(sender, instance, created, **kwargs):
-    """Обновляет статус номера при сохранении бронирования"""
-    if not instance.is_deleted:
-        instance.room.update_status()
+    """Планирует пересчёт статуса номера (и прежнего номера при переносе) после коммита"""
+    room_status.schedule(instance.room_id, getattr(instance, '_loaded_room_id', None))
+    instance._loaded_room_id = instance.room_id
 
 @receiver(post_delete, sender=Booking)
 def update_room_status_on_booking_delete(sender, instance, **kwargs):
-    """Обновляет статус номера при удалении бронирования"""
-    if not instance.is_deleted:
-        instance.room.update_status()
+    """Планирует пересчёт статуса номера после удаления бронирования"""
+    room_status.schedule(instance.room_id)
+
+# Статистика гостя (total_spent, visits_count)
+@receiver(post_save, sender=Booking)
+def update_guest_stats_on_booking_save(sender, instance, created, **kwargs):
+    """Переносит вклад бронирования в статистику гостя с прежних значений на новые"""
+    old = None if created else getattr(instance, '_loaded_guest_stats', None)
+    new = guest_stats.snapshot(instance)
+    if (created or old is not None) and new is not None:
+        guest_stats.apply(old, new)
+    else:
+        # Прежний вклад неизвестен (объект не загружен из БД целиком) - пересчитываем гостя
+        guest_stats.recompute([instance.guest_id])
+    instance._loaded_guest_stats = new
+
+@receiver(post_delete, sender=Booking)
+def update_guest_stats_on_booking_delete(sender, instance, **kwargs):
+    """Убирает вклад удалённого бронирования из статистики гостя"""
+    old = getattr(instance, '_loaded_guest_stats', None) or guest_stats.snapshot(instance)
+    if old is not None:
+        guest_stats.apply(old, None)
+    else:
+        guest_stats.recompute([instance.guest_id])
 
 @receiver(post_save, sender=Booking)
 def log_booking_save(sender, instance, created, **kwargs):
     action = 'Создание' if created else 'Изменение'
-    AuditLog.objects.create(
-        user=instance.created_by,
+    audit.log(
+        user=instance.created_by_id,
         action=action,
         object_type='Booking',
         object_id=instance.id,
@@ -239,8 +399,8 @@ def log_booking_save(sender, instance, created, **kwargs):
 
 @receiver(post_delete, sender=Booking)
 def log_booking_delete(sender, instance, **kwargs):
-    AuditLog.objects.create(
-        user=instance.created_by,
+    audit.log(
+        user=instance.created_by_id,
         action='Удаление',
         object_type='Booking',
         object_id=instance.id,
@@ -250,7 +410,7 @@ def log_booking_delete(sender, instance, **kwargs):
 @receiver(post_save, sender=Room)
 def log_room_save(sender, instance, created, **kwargs):
     action = 'Создание' if created else 'Изменение'
-    AuditLog.objects.create(
+    audit.log(
         user=None,
         action=action,
         object_type='Room',
@@ -260,10 +420,49 @@ def log_room_save(sender, instance, created, **kwargs):
 
 @receiver(post_delete, sender=Room)
 def log_room_delete(sender, instance, **kwargs):
-    AuditLog.objects.create(
+    audit.log(
         user=None,
         action='Удаление',
         object_type='Room',
         object_id=instance.id,
         details=f'Удалена комната: {instance.building} {instance.number}, вместимость: {instance.capacity}, тип: {instance.room_type}, статус: {instance.status}'
     )
+
+# Поток изменений для клиентов (см. booking/events.py)
+@receiver(post_save, sender=Booking)
+def publish_booking_save(sender, instance, created, **kwargs):
+    events.publish_booking(instance, created=created)
+
+@receiver(post_delete, sender=Booking)
+def publish_booking_delete(sender, instance, **kwargs):
+    events.publish_booking(instance, deleted=True)
+
+@receiver(post_save, sender=Room)
+def publish_room_status(sender, instance, created, **kwargs):
+    loaded = getattr(instance, '_loaded_status', None)
+    if not created and loaded is not None and loaded != instance.status:
+        events.publish_room_status(instance.id, instance.building_id, instance.status)
+    instance._loaded_status = instance.status
+
+# Кэш сотрудника для JWT-аутентификации (см. booking/authentication.py)
+@receiver(post_save, sender=User)
+def forget_cached_user(sender, instance, created, **kwargs):
+    from . import authentication
+    authentication.forget(instance)
+    instance._loaded_claims = {field: instance.__dict__.get(field) for field in authentication.REVOKING_FIELDS}
+
+@receiver(post_delete, sender=User)
+def forget_deleted_user(sender, instance, **kwargs):
+    from . import authentication
+    authentication.forget(instance)
+
+# Сброс кэша справочников (корпуса, номера) после изменений
+@receiver(post_save, sender=Building)
+@receiver(post_delete, sender=Building)
+def invalidate_buildings_cache(sender, instance, **kwargs):
+    response_cache.invalidate('buildings', 'rooms')
+
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+def invalidate_rooms_cache(sender, instance, **kwargs):
+    response_cache.invalidate('rooms')
@@ -0,0 +1,30 @@
+from rest_framework.pagination import CursorPagination
+
+
+class FemidaCursorPagination(CursorPagination):
+    """
+    Курсорная пагинация по индексированным полям, включена по умолчанию.
+    ?paginate=false - весь список массивом, для старых клиентов.
+    Viewset с paginate_by_default = False (списки, которые фронтенд читает массивом)
+    отдаёт массив, пока клиент не передаст ?cursor= или ?page_size=.
+    Порядок страниц задаётся атрибутом viewset'а cursor_ordering.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = '-id'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'cursor_ordering', self.ordering)
+        if isinstance(ordering, str):
+            return (ordering,)
+        return tuple(ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if params.get('paginate') == 'false':
+            return None
+        requested = self.cursor_query_param in params or self.page_size_query_param in params
+        if not requested and not getattr(view, 'paginate_by_default', True):
+            return None
+        return super().paginate_queryset(queryset, request, view)
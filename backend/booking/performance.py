@@ -0,0 +1,85 @@
+"""
+Метрики производительности запроса (см. PerformanceMiddleware).
+
+Для выбранных (sample) запросов через connection.execute_wrapper считаются
+число SQL-запросов, время в БД, самые медленные запросы и повторы одного и того
+же SQL (признак N+1). Участки кода замеряются через timed(name); время БД внутри
+участка из него вычитается.
+"""
+import contextvars
+import heapq
+from collections import Counter
+from contextlib import contextmanager
+from time import perf_counter
+
+_current = contextvars.ContextVar('booking_performance_metrics', default=None)
+
+
+class RequestMetrics:
+    def __init__(self, slow_queries=5):
+        self.slow_queries = slow_queries
+        self.queries = 0
+        self.db_time = 0.0
+        self.timings = {}
+        self.statements = Counter()
+        self._slowest = []
+
+    def __call__(self, execute, sql, params, many, context):
+        """execute_wrapper: замер каждого SQL-запроса"""
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = perf_counter() - started
+            self.queries += 1
+            self.db_time += duration
+            self.statements[sql] += 1
+            item = (duration, self.queries, sql)
+            if len(self._slowest) < self.slow_queries:
+                heapq.heappush(self._slowest, item)
+            elif duration > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, item)
+
+    def add(self, name, duration):
+        self.timings[name] = self.timings.get(name, 0.0) + duration
+
+    def slowest(self):
+        """Самые медленные запросы: [{'ms': ..., 'sql': ...}], по убыванию времени"""
+        return [
+            {'ms': round(duration * 1000, 2), 'sql': sql[:1000]}
+            for duration, _, sql in sorted(self._slowest, reverse=True)
+        ]
+
+    def most_repeated(self):
+        """Чаще всего повторявшийся SQL и число повторов (N+1)"""
+        if not self.statements:
+            return None, 0
+        sql, count = self.statements.most_common(1)[0]
+        return sql, count
+
+
+def start(slow_queries=5):
+    metrics = RequestMetrics(slow_queries)
+    return metrics, _current.set(metrics)
+
+
+def stop(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def timed(name):
+    """Замеряет участок кода запроса (без времени БД); вне замеряемого запроса ничего не делает"""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started, db_time = perf_counter(), metrics.db_time
+    try:
+        yield
+    finally:
+        metrics.add(name, perf_counter() - started - (metrics.db_time - db_time))
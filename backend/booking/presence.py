@@ -0,0 +1,108 @@
+"""
+Учёт присутствия сотрудников через кэш Django.
+
+Middleware отмечает активность пользователя в кэше не чаще одного раза за
+USER_PRESENCE_INTERVAL секунд, без записи в БД. Фоновый поток веб-процесса
+раз в USER_PRESENCE_FLUSH_INTERVAL секунд переносит накопленные значения
+в User.last_seen одним bulk_update, поэтому last_seen сохраняется и с кэшем
+процесса (LocMemCache). Но тогда is_online() видит только активность в своём
+процессе: для нескольких воркеров нужен общий кэш (Redis, Memcached).
+Команда flush_presence работает только с общим кэшем.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'presence:last_seen:'
+KEY_TIMEOUT = 60 * 60 * 24
+ONLINE_WINDOW = timedelta(minutes=5)
+
+
+def _key(user_id):
+    return f'{KEY_PREFIX}{user_id}'
+
+
+def touch(user):
+    """Отмечает активность пользователя; обращается к кэшу, но не к БД"""
+    _start_flusher()
+    now = timezone.now()
+    interval = getattr(settings, 'USER_PRESENCE_INTERVAL', 60)
+    last = cache.get(_key(user.pk))
+    if last and (now - last).total_seconds() < interval:
+        return
+    cache.set(_key(user.pk), now, KEY_TIMEOUT)
+
+
+async def atouch(user):
+    """touch() для async-запросов"""
+    _start_flusher()
+    now = timezone.now()
+    interval = getattr(settings, 'USER_PRESENCE_INTERVAL', 60)
+    last = await cache.aget(_key(user.pk))
+    if last and (now - last).total_seconds() < interval:
+        return
+    await cache.aset(_key(user.pk), now, KEY_TIMEOUT)
+
+
+def last_seen(user):
+    """Последняя активность: значение из кэша, если оно новее сохранённого в БД"""
+    cached = cache.get(_key(user.pk))
+    if cached and (not user.last_seen or cached > user.last_seen):
+        return cached
+    return user.last_seen
+
+
+def is_online(user):
+    seen = last_seen(user)
+    return bool(seen) and seen >= timezone.now() - ONLINE_WINDOW
+
+
+def flush():
+    """Сохраняет last_seen из кэша в БД; возвращает количество обновлённых пользователей"""
+    from .models import User
+
+    users = list(User.objects.only('id', 'last_seen'))
+    cached = cache.get_many([_key(user.pk) for user in users])
+    changed = []
+    for user in users:
+        seen = cached.get(_key(user.pk))
+        if seen and (not user.last_seen or seen > user.last_seen):
+            user.last_seen = seen
+            changed.append(user)
+    if changed:
+        User.objects.bulk_update(changed, ['last_seen'])
+    return len(changed)
+
+
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def _start_flusher():
+    """Запускает фоновый поток flush() при первой отмеченной активности процесса"""
+    global _flusher
+    interval = getattr(settings, 'USER_PRESENCE_FLUSH_INTERVAL', 300)
+    if _flusher is not None or not interval:
+        return
+    with _flusher_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_loop, args=(interval,), name='presence-flush', daemon=True)
+            _flusher.start()
+
+
+def _flush_loop(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            flush()
+        except Exception:
+            logger.exception('Не удалось сохранить last_seen')
+        finally:
+            close_old_connections()
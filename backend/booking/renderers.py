@@ -0,0 +1,29 @@
+"""
+JSON-рендерер на orjson.
+
+Вывод совпадает с rest_framework.renderers.JSONRenderer: нестандартные типы
+(Decimal, datetime, ленивые строки и т.п.) преобразуются тем же JSONEncoder DRF.
+Если orjson не установлен или запрошен отступ (indent), используется обычный рендерер.
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson необязателен
+    orjson = None
+
+_encoder = JSONEncoder()
+
+
+class ORJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        return orjson.dumps(
+            data,
+            default=_encoder.default,
+            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+        )
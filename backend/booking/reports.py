@@ -0,0 +1,409 @@
+import asyncio
+import calendar
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from asgiref.sync import sync_to_async
+from django.db.models import Count, Sum, Q, Value, DateField, Exists, OuterRef
+from django.db.models.functions import Greatest, Least, TruncDate, TruncDay, TruncWeek, TruncMonth
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from .models import Room, Guest, Booking
+
+
+def _money(value):
+    """Денежная сумма строкой с двумя знаками, как отдаёт DecimalField"""
+    return str((value or Decimal('0')).quantize(Decimal('0.01')))
+
+
+def _dashboard_room_counts():
+    return {
+        'total_rooms': Count('id'),
+        'free_rooms': Count('id', filter=Q(status='free')),
+        'busy_rooms': Count('id', filter=Q(status='busy')),
+        'repair_rooms': Count('id', filter=Q(status='repair')),
+    }
+
+
+def _dashboard_booking_counts(today):
+    today_checkin = Q(check_in__date=today)
+    return {
+        'total_bookings': Count('id'),
+        'active_bookings': Count('id', filter=Q(status='active')),
+        'today_checkins': Count('id', filter=today_checkin),
+        'today_checkouts': Count('id', filter=Q(check_out__date=today)),
+        'pending_payments': Count('id', filter=~Q(payment_status='paid')),
+        'revenue_today': Sum('total_amount', filter=today_checkin),
+        'paid_today': Sum('total_amount', filter=today_checkin & Q(payment_status='paid')),
+    }
+
+
+def dashboard_summary(today=None):
+    """Сводные показатели для главной страницы, считаются агрегатами в БД"""
+    today = today or timezone.localdate()
+    rooms = Room.objects.filter(is_deleted=False).aggregate(**_dashboard_room_counts())
+    bookings = Booking.objects.filter(is_deleted=False).aggregate(**_dashboard_booking_counts(today))
+    total_guests = Guest.objects.filter(is_deleted=False).count()
+    return _dashboard(today, rooms, bookings, total_guests)
+
+
+async def adashboard_summary(today=None):
+    """dashboard_summary() для async-представлений: три независимых агрегата через asyncio.gather"""
+    today = today or timezone.localdate()
+    rooms, bookings, total_guests = await asyncio.gather(
+        Room.objects.filter(is_deleted=False).aaggregate(**_dashboard_room_counts()),
+        Booking.objects.filter(is_deleted=False).aaggregate(**_dashboard_booking_counts(today)),
+        Guest.objects.filter(is_deleted=False).acount(),
+    )
+    return _dashboard(today, rooms, bookings, total_guests)
+
+
+def _dashboard(today, rooms, bookings, total_guests):
+    return {
+        'date': today.isoformat(),
+        'rooms': {
+            'total': rooms['total_rooms'],
+            'free': rooms['free_rooms'],
+            'busy': rooms['busy_rooms'],
+            'repair': rooms['repair_rooms'],
+        },
+        'total_bookings': bookings['total_bookings'],
+        'active_bookings': bookings['active_bookings'],
+        'today_checkins': bookings['today_checkins'],
+        'today_checkouts': bookings['today_checkouts'],
+        'pending_payments': bookings['pending_payments'],
+        'total_guests': total_guests,
+        'revenue_today': _money(bookings['revenue_today']),
+        'paid_today': _money(bookings['paid_today']),
+    }
+
+
+REPORT_GROUPS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+
+# Три года: строк по дням не больше ~1100, по месяцам - 37
+REPORT_MAX_DAYS = 3 * 366
+
+
+class ReportParamsError(ValueError):
+    """Некорректные параметры отчёта"""
+
+
+def _parse_report_date(params, name, default):
+    value = params.get(name)
+    if not value:
+        return default
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ReportParamsError(f"Некорректная дата в параметре {name}: {value}")
+    return parsed
+
+
+def _period_end(start, group_by):
+    """Последний день периода, начинающегося в start"""
+    if group_by == 'day':
+        return start
+    if group_by == 'week':
+        return start + timedelta(days=6)
+    return start.replace(day=calendar.monthrange(start.year, start.month)[1])
+
+
+def _period_days(start, group_by, date_from, date_to):
+    """Количество дней периода, попадающих в диапазон отчёта"""
+    return (min(_period_end(start, group_by), date_to) - max(start, date_from)).days + 1
+
+
+def _periods(group_by, date_from, date_to):
+    """Начала периодов (как у TruncDay/TruncWeek/TruncMonth), пересекающих диапазон отчёта"""
+    if group_by == 'day':
+        start = date_from
+    elif group_by == 'week':
+        start = date_from - timedelta(days=date_from.weekday())
+    else:
+        start = date_from.replace(day=1)
+    periods = []
+    while start <= date_to:
+        periods.append(start)
+        start = _period_end(start, group_by) + timedelta(days=1)
+    return periods
+
+
+def _nights(stays, periods, date_from, date_to):
+    """
+    Ночи по периодам одним запросом: проживания группируются по датам заезда и выезда,
+    обрезанным границами отчёта, затем по дням считается число занятых номеров.
+    Ночь относится к дате, с которой она начинается.
+    """
+    spans = (
+        stays
+        .annotate(
+            night_from=Greatest(TruncDate('check_in'), Value(date_from, output_field=DateField())),
+            night_to=Least(TruncDate('check_out'), Value(date_to + timedelta(days=1), output_field=DateField())),
+        )
+        .values('night_from', 'night_to')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    # Изменение числа занятых номеров по датам: +заезды, -выезды
+    change = defaultdict(int)
+    for span in spans:
+        change[span['night_from']] += span['count']
+        change[span['night_to']] -= span['count']
+
+    nights = dict.fromkeys(periods, 0)
+    occupied = 0
+    index = 0
+    day = date_from
+    while day <= date_to:
+        occupied += change[day]
+        while index + 1 < len(periods) and periods[index + 1] <= day:
+            index += 1
+        nights[periods[index]] += occupied
+        day += timedelta(days=1)
+    return nights
+
+
+def build_report(params):
+    """
+    Отчёт по бронированиям с группировкой по дням, неделям или месяцам.
+    Фильтры: date_from, date_to, building, room_class, payment_status. Число и суммы
+    бронирований относятся к периоду заезда, ночи и загрузка - к периодам, в которые гость живёт.
+    Всё считается в БД агрегатами, строки бронирований не загружаются.
+    """
+    today = timezone.localdate()
+    date_from = _parse_report_date(params, 'date_from', today.replace(day=1))
+    date_to = _parse_report_date(params, 'date_to', today)
+    if date_from > date_to:
+        raise ReportParamsError("Дата начала периода позже даты окончания")
+    if (date_to - date_from).days > REPORT_MAX_DAYS:
+        raise ReportParamsError(f"Период отчёта не может превышать {REPORT_MAX_DAYS} дней")
+
+    group_by = params.get('group_by') or 'day'
+    if group_by not in REPORT_GROUPS:
+        raise ReportParamsError("Параметр group_by должен быть day, week или month")
+
+    rooms = Room.objects.filter(is_deleted=False, is_active=True)
+    # Проживания для ночей и загрузки: все, что пересекают диапазон отчёта
+    stays = Booking.objects.filter(
+        is_deleted=False,
+        check_in__date__lte=date_to,
+        check_out__date__gt=date_from,
+    ).exclude(status='cancelled')
+
+    building = params.get('building')
+    if building:
+        if not str(building).isdigit():
+            raise ReportParamsError("Параметр building должен быть числом")
+        rooms = rooms.filter(building_id=building)
+        stays = stays.filter(room__building_id=building)
+    room_class = params.get('room_class')
+    if room_class:
+        rooms = rooms.filter(room_class=room_class)
+        stays = stays.filter(room__room_class=room_class)
+    payment_status = params.get('payment_status')
+    if payment_status:
+        stays = stays.filter(payment_status=payment_status)
+    # Количество и суммы бронирований - по дате заезда
+    bookings = stays.filter(check_in__date__gte=date_from)
+
+    rooms_count = rooms.count()
+    is_paid = Q(payment_status='paid')
+    rows = {
+        row['period']: row for row in
+        bookings
+        .annotate(period=REPORT_GROUPS[group_by]('check_in', output_field=DateField()))
+        .values('period')
+        .annotate(
+            bookings=Count('id'),
+            revenue=Sum('total_amount'),
+            paid=Sum('total_amount', filter=is_paid),
+            unpaid=Sum('total_amount', filter=~is_paid),
+        )
+    }
+    nights_by_period = _nights(stays, _periods(group_by, date_from, date_to), date_from, date_to)
+
+    result_rows = []
+    totals = {'bookings': 0, 'revenue': Decimal('0'), 'paid': Decimal('0'), 'unpaid': Decimal('0'), 'nights': 0}
+    for period, nights in nights_by_period.items():
+        row = rows.get(period, {'bookings': 0, 'revenue': None, 'paid': None, 'unpaid': None})
+        if not row['bookings'] and not nights:
+            continue
+        capacity = rooms_count * _period_days(period, group_by, date_from, date_to)
+        result_rows.append({
+            'period': period.isoformat(),
+            'bookings': row['bookings'],
+            'revenue': _money(row['revenue']),
+            'paid': _money(row['paid']),
+            'unpaid': _money(row['unpaid']),
+            'nights': nights,
+            'occupancy': round(nights * 100 / capacity, 2) if capacity else 0,
+        })
+        totals['bookings'] += row['bookings']
+        totals['nights'] += nights
+        for key in ('revenue', 'paid', 'unpaid'):
+            totals[key] += row[key] or Decimal('0')
+
+    total_capacity = rooms_count * ((date_to - date_from).days + 1)
+    return {
+        'date_from': date_from.isoformat(),
+        'date_to': date_to.isoformat(),
+        'group_by': group_by,
+        'rooms_count': rooms_count,
+        'totals': {
+            'bookings': totals['bookings'],
+            'revenue': _money(totals['revenue']),
+            'paid': _money(totals['paid']),
+            'unpaid': _money(totals['unpaid']),
+            'nights': totals['nights'],
+            'occupancy': round(totals['nights'] * 100 / total_capacity, 2) if total_capacity else 0,
+        },
+        'rows': result_rows,
+    }
+
+
+CALENDAR_MAX_DAYS = 366
+
+
+def short_name(full_name):
+    """«Иванов Иван Иванович» -> «Иванов И. И.»"""
+    parts = full_name.split()
+    if len(parts) < 2:
+        return full_name
+    return ' '.join([parts[0]] + [f'{part[0]}.' for part in parts[1:]])
+
+
+def occupancy_calendar(params):
+    """
+    Компактная шахматка: номера с интервалами бронирований, пересекающих окно from..to.
+    Интервал: [id брони, заезд, выезд, статус, краткое имя гостя].
+    Бронирования выбираются одним запросом по индексу даты заезда, без сериализации гостей.
+    """
+    date_from, date_to, rooms, bookings = _calendar_querysets(params)
+    return _calendar(date_from, date_to, list(rooms), list(bookings))
+
+
+async def aoccupancy_calendar(params):
+    """occupancy_calendar() для async-представлений: номера и бронирования читаются через asyncio.gather"""
+    date_from, date_to, rooms, bookings = _calendar_querysets(params)
+    rooms, bookings = await asyncio.gather(_alist(rooms), _alist(bookings))
+    return _calendar(date_from, date_to, rooms, bookings)
+
+
+async def _alist(queryset):
+    # values_list().aiterator() в Django 5.2 выполняет запрос прямо в event loop
+    # (SynchronousOnlyOperation), поэтому кортежи читаются одним вызовом в потоке
+    return await sync_to_async(list)(queryset)
+
+
+def _calendar_querysets(params):
+    """Проверяет параметры шахматки и строит (from, to, номера, бронирования) без обращения к БД"""
+    today = timezone.localdate()
+    date_from = _parse_report_date(params, 'from', today)
+    date_to = _parse_report_date(params, 'to', today + timedelta(days=30))
+    if date_from > date_to:
+        raise ReportParamsError("Дата начала периода позже даты окончания")
+    if (date_to - date_from).days > CALENDAR_MAX_DAYS:
+        raise ReportParamsError(f"Период календаря не может превышать {CALENDAR_MAX_DAYS} дней")
+
+    tz = timezone.get_current_timezone()
+    window_start = datetime.combine(date_from, time.min, tzinfo=tz)
+    window_end = datetime.combine(date_to + timedelta(days=1), time.min, tzinfo=tz)
+
+    rooms = Room.objects.filter(is_deleted=False)
+    bookings = Booking.objects.filter(is_deleted=False, check_in__lt=window_end, check_out__gt=window_start)
+    building = params.get('building')
+    if building:
+        if not str(building).isdigit():
+            raise ReportParamsError("Параметр building должен быть числом")
+        rooms = rooms.filter(building_id=building)
+        bookings = bookings.filter(room__building_id=building)
+
+    rooms = rooms.order_by('building_id', 'number').values_list('id', 'number', 'building_id', 'status')
+    bookings = bookings.order_by('check_in').values_list(
+        'room_id', 'id', 'check_in', 'check_out', 'status', 'guest__full_name'
+    )
+    return date_from, date_to, rooms, bookings
+
+
+def _calendar(date_from, date_to, rooms, bookings):
+    intervals = {}
+    for room_id, booking_id, check_in, check_out, booking_status, guest_name in bookings:
+        intervals.setdefault(room_id, []).append(
+            [booking_id, check_in.isoformat(), check_out.isoformat(), booking_status, short_name(guest_name)]
+        )
+
+    return {
+        'from': date_from.isoformat(),
+        'to': date_to.isoformat(),
+        'rooms': [
+            {
+                'id': room_id,
+                'number': number,
+                'building_id': building_id,
+                'status': room_status,
+                'bookings': intervals.get(room_id, []),
+            }
+            for room_id, number, building_id, room_status in rooms
+        ],
+    }
+
+
+def _parse_datetime_param(value):
+    """Разбирает дату или дату-время из query-параметра; дата без времени считается началом суток"""
+    if not value:
+        return None
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            parsed_date = parse_date(value)
+            if parsed_date is None:
+                return None
+            parsed = datetime.combine(parsed_date, time.min)
+    except ValueError:
+        return None
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def available_rooms(params):
+    """
+    Свободные номера на период: check_in, check_out, people, building, room_class, ordering.
+    Возвращает queryset (без обращения к БД); некорректные параметры - ReportParamsError.
+    """
+    check_in = _parse_datetime_param(params.get('check_in'))
+    check_out = _parse_datetime_param(params.get('check_out'))
+    if not check_in or not check_out:
+        raise ReportParamsError('Необходимы корректные check_in и check_out')
+    if check_in >= check_out:
+        raise ReportParamsError('Дата выезда должна быть позже даты заезда')
+
+    ordering = params.get('ordering') or 'price_per_night'
+    if ordering.lstrip('-') not in ('price_per_night', 'capacity'):
+        raise ReportParamsError('ordering может быть только price_per_night или capacity')
+
+    overlapping = Booking.objects.filter(
+        room=OuterRef('pk'),
+        status='active',
+        is_deleted=False,
+        check_in__lt=check_out,
+        check_out__gt=check_in
+    )
+    rooms = Room.objects.filter(is_deleted=False, is_active=True).exclude(status='repair')
+    people = params.get('people')
+    if people:
+        if not people.isdigit():
+            raise ReportParamsError('people должно быть числом')
+        rooms = rooms.filter(capacity__gte=int(people))
+    building = params.get('building')
+    if building:
+        if not building.isdigit():
+            raise ReportParamsError('building должно быть числом')
+        rooms = rooms.filter(building_id=building)
+    if params.get('room_class'):
+        rooms = rooms.filter(room_class=params['room_class'])
+    return rooms.filter(~Exists(overlapping)).order_by(ordering, 'id')
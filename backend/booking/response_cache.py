@@ -0,0 +1,105 @@
+"""
+Кэш ответов для редко меняющихся справочников (корпуса, номера).
+
+У каждого пространства имён есть версия в кэше - момент последнего изменения.
+Сигналы моделей после коммита увеличивают версию, и старые записи перестают
+использоваться. Версия даёт ETag и Last-Modified, поэтому на If-None-Match /
+If-Modified-Since ответ 304 отдаётся без обращения к базе.
+
+Версию должны видеть все процессы, поэтому кэш ответов работает только с общим
+кэшем (Redis, Memcached). С кэшем процесса (LocMemCache по умолчанию) другие
+воркеры отдавали бы устаревшие списки и 304, и списки идут мимо кэша. Для
+одного процесса (runserver, один воркер) его можно включить
+RESPONSE_CACHE_PER_PROCESS = True.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import commit_buffers, shared_cache
+
+VERSION_KEY = 'respcache:version:{}'
+
+
+def _timeout():
+    return getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300)
+
+
+def enabled():
+    """Можно ли кэшировать ответы: кэш общий для процессов или процесс один"""
+    return getattr(settings, 'RESPONSE_CACHE_PER_PROCESS', False) or shared_cache.is_shared()
+
+
+def get_version(namespace):
+    """Версия пространства имён (время последнего изменения в микросекундах)"""
+    key = VERSION_KEY.format(namespace)
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns() // 1000
+        # add не перетирает версию, если её успел выставить другой процесс
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump(*namespaces):
+    """Помечает пространства имён изменёнными"""
+    for namespace in namespaces:
+        key = VERSION_KEY.format(namespace)
+        version = max(time.time_ns() // 1000, (cache.get(key) or 0) + 1)
+        cache.set(key, version, None)
+
+
+def invalidate(*namespaces):
+    """Сбрасывает кэш после коммита, чтобы параллельный запрос не закэшировал незакоммиченное состояние"""
+    pending = commit_buffers.get('response_cache', lambda names: bump(*names), set)
+    if pending is None:
+        bump(*namespaces)
+    else:
+        pending.update(namespaces)
+
+
+class CachedListMixin:
+    """
+    Кэширует ответ list() viewset'а по набору query-параметров.
+    Viewset задаёт cache_namespace; инвалидация - через response_cache.invalidate().
+    """
+    cache_namespace = None
+
+    def list(self, request, *args, **kwargs):
+        if not enabled():
+            return super().list(request, *args, **kwargs)
+        version = get_version(self.cache_namespace)
+        params = sorted(request.query_params.lists())
+        digest = hashlib.md5(repr(params).encode()).hexdigest()
+        etag = f'"{self.cache_namespace}-{version}-{digest[:12]}"'
+        last_modified = version // 1_000_000
+
+        if_none_match = request.headers.get('If-None-Match')
+        if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since') or '')
+        # Last-Modified точен до секунды, а версия - до микросекунды: по If-Modified-Since
+        # 304 только если изменение было строго раньше этой секунды, иначе оно могло быть после
+        if (if_none_match and etag in [tag.strip() for tag in if_none_match.split(',')]) or (
+            not if_none_match and if_modified_since and version < if_modified_since * 1_000_000
+        ):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            key = f'respcache:{self.cache_namespace}:{version}:{digest}'
+            data = cache.get(key)
+            if data is None:
+                response = super().list(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                cache.set(key, response.data, _timeout())
+            else:
+                response = Response(data)
+
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = 'private, no-cache'
+        return response
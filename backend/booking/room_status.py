@@ -0,0 +1,87 @@
+"""
+Пересчёт статусов номеров по активным бронированиям.
+
+Номер занят, если активное бронирование идёт прямо сейчас (current()): будущие
+заезды статус не меняют. Это же правило проверяют сериализатор номера и массовое
+изменение номеров, когда номер пытаются освободить. Когда наступает заезд или
+выезд, статусы обновляет периодическая команда, которую нужно запускать рядом
+с веб-процессом (см. femida/asgi.py):
+
+    python manage.py update_room_statuses --every 300
+
+Вместо вызова Room.update_status() на каждое сохранение бронирования
+затронутые номера собираются за транзакцию и пересчитываются после коммита
+одним UPDATE с CASE по подзапросу Exists. В журнал попадают только номера,
+у которых статус действительно изменился.
+"""
+from django.db.models import Case, Exists, F, OuterRef, Value, When
+from django.utils import timezone
+
+from . import audit, commit_buffers, events, response_cache
+
+def schedule(*room_ids):
+    """Откладывает пересчёт статусов номеров до коммита текущей транзакции"""
+    room_ids = {room_id for room_id in room_ids if room_id}
+    if not room_ids:
+        return
+    pending = commit_buffers.get('room_status', recompute, set)
+    if pending is None:
+        recompute(room_ids)
+    else:
+        pending.update(room_ids)
+
+
+def current(bookings, now=None):
+    """Бронирования из bookings, которые идут в момент now (по умолчанию - сейчас): из-за них номер занят"""
+    now = now or timezone.now()
+    return bookings.filter(status='active', is_deleted=False, check_in__lte=now, check_out__gt=now)
+
+
+def status_expression(now=None):
+    """'busy', если у номера есть активное бронирование на момент now (по умолчанию - сейчас), иначе 'free'"""
+    from .models import Booking
+
+    active = current(Booking.objects.filter(room=OuterRef('pk')), now)
+    return Case(When(Exists(active), then=Value('busy')), default=Value('free'))
+
+
+def recompute(room_ids=None, rooms=None):
+    """
+    Пересчитывает статусы номеров (кроме находящихся на ремонте).
+    room_ids=None - все номера; rooms - готовый queryset для отбора.
+    Возвращает список изменений [(id, старый статус, новый статус), ...].
+    """
+    from .models import Room
+
+    if rooms is None:
+        rooms = Room.objects.all()
+    if room_ids is not None:
+        if not room_ids:
+            return []
+        rooms = rooms.filter(id__in=room_ids)
+
+    now = timezone.now()
+    changed = list(
+        rooms.exclude(status='repair')
+        .annotate(new_status=status_expression(now))
+        .exclude(status=F('new_status'))
+        .values('id', 'number', 'capacity', 'room_type', 'status', 'new_status', 'building_id', 'building__name')
+    )
+    if not changed:
+        return []
+
+    Room.objects.filter(id__in=[row['id'] for row in changed]).exclude(status='repair').update(
+        status=status_expression(now)
+    )
+    response_cache.invalidate('rooms')
+    for row in changed:
+        audit.log(
+            user=None,
+            action='Изменение',
+            object_type='Room',
+            object_id=row['id'],
+            details=f"Комната: {row['building__name']} {row['number']}, вместимость: {row['capacity']}, "
+                    f"тип: {row['room_type']}, статус: {row['new_status']}"
+        )
+        events.publish_room_status(row['id'], row['building_id'], row['new_status'])
+    return [(row['id'], row['status'], row['new_status']) for row in changed]
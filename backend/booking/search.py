@@ -0,0 +1,63 @@
+"""
+Поиск гостей для автодополнения по ФИО, телефону и ИНН.
+
+В PostgreSQL подстрочный поиск обслуживают GIN-индексы pg_trgm (миграция 0008)
+на UPPER(full_name), phone и inn, поэтому icontains/contains не читает всю
+таблицу. Результаты дополнительно ранжируются по сходству trigram.
+На других БД (SQLite в тестах) работает тот же запрос без индексов и сходства.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+
+SEARCH_DEFAULT_LIMIT = 10
+SEARCH_MAX_LIMIT = 50
+SEARCH_MIN_LENGTH = 2
+SEARCH_FIELDS = ('id', 'full_name', 'phone', 'inn', 'status')
+
+
+def search_guests(query, limit=SEARCH_DEFAULT_LIMIT):
+    """
+    Ищет гостей по строке query, возвращает список словарей SEARCH_FIELDS.
+    Порядок: точное совпадение, совпадение с начала строки, остальные.
+    """
+    from .models import Guest
+
+    query = ' '.join(query.split())
+    if len(query) < SEARCH_MIN_LENGTH:
+        return []
+    limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+
+    words = query.split()
+    if re.fullmatch(r'[\d\s()+-]+', query):
+        # Телефоны хранятся нормализованными (+996...), поэтому сравниваем только цифры
+        digits = re.sub(r'\D', '', query)
+        if not digits:
+            return []
+        condition = Q(phone__contains=digits) | Q(inn__contains=digits)
+        exact = Q(phone=f'+{digits}') | Q(inn=digits)
+        prefix = Q(phone__startswith=f'+{digits}') | Q(inn__startswith=digits)
+    else:
+        condition = Q()
+        for word in words:
+            condition &= Q(full_name__icontains=word)
+        exact = Q(full_name__iexact=query)
+        prefix = Q(full_name__istartswith=words[0])
+
+    guests = Guest.objects.filter(condition, is_deleted=False).annotate(
+        rank=Case(
+            When(exact, then=Value(2)),
+            When(prefix, then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+    )
+    ordering = ['-rank']
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        guests = guests.annotate(similarity=TrigramWordSimilarity(query, 'full_name'))
+        ordering.append('-similarity')
+    ordering += ['full_name', 'id']
+    return list(guests.order_by(*ordering).values(*SEARCH_FIELDS)[:limit])
@@ -1,17 +1,20 @@
 from rest_framework import serializers
-from django.db.models import Sum
-from .models import User, Room, Guest, Booking, AuditLog, Building
+from django.db import IntegrityError, transaction
+from . import audit, response_cache, room_status
+from .sparse import SparseFieldsMixin
+from .models import User, Room, Guest, Booking, AuditLog, Building, BOOKING_OVERLAP_CONSTRAINT
 import logging
 
 logger = logging.getLogger(__name__)
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=False)
     is_online = serializers.SerializerMethodField()
 
     class Meta:
         model = User
         fields = ('id', 'username', 'role', 'phone', 'email', 'first_name', 'last_name', 'password', 'is_online')
+        sparse_requires = {'is_online': ('last_seen',)}
 
     def get_is_online(self, obj):
         return obj.is_online()
@@ -32,14 +35,53 @@ class UserSerializer(serializers.ModelSerializer):
             user.save()
         return user
 
-class BuildingSerializer(serializers.ModelSerializer):
+# Представления для быстрого списка (Meta.fast_fields, см. fast_list.py)
+ROOM_CLASS_LABELS = dict(Room._meta.get_field('room_class').flatchoices)
+
+def building_ref(building_id, name):
+    return {'id': building_id, 'name': name}
+
+def room_class_ref(value):
+    return {'value': value, 'label': ROOM_CLASS_LABELS.get(value, value)}
+
+class BuildingSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Building
         fields = '__all__'
 
-class RoomSerializer(serializers.ModelSerializer):
+class BuildingIdField(serializers.PrimaryKeyRelatedField):
+    """Корпус по id; при массовой загрузке берётся из заранее загруженного context['buildings']"""
+
+    def to_internal_value(self, data):
+        buildings = self.context.get('buildings')
+        if buildings is None:
+            return super().to_internal_value(data)
+        try:
+            return buildings[int(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+class RoomListSerializer(serializers.ListSerializer):
+    """Массовое создание номеров одним bulk_create и одной пачкой записей журнала"""
+
+    def create(self, validated_data):
+        rooms = Room.objects.bulk_create([Room(**item) for item in validated_data])
+        for room in rooms:
+            audit.log(
+                user=None,
+                action='Создание',
+                object_type='Room',
+                object_id=room.id,
+                details=f'Комната: {room.building} {room.number}, вместимость: {room.capacity}, тип: {room.room_type}, статус: {room.status}'
+            )
+        response_cache.invalidate('rooms')
+        return rooms
+
+class RoomSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     building = serializers.SerializerMethodField()
-    building_id = serializers.PrimaryKeyRelatedField(queryset=Building.objects.all(), source='building', write_only=True)
+    building_id = BuildingIdField(queryset=Building.objects.all(), source='building', write_only=True)
     # room_class теперь двустороннее поле (и на чтение, и на запись)
     room_class = serializers.CharField(required=True)
     room_class_display = serializers.SerializerMethodField(read_only=True)
@@ -55,14 +97,10 @@ class RoomSerializer(serializers.ModelSerializer):
     def validate_status(self, value):
         """Валидация статуса номера"""
         if self.instance and value == 'free':
-            # Проверяем, есть ли активные бронирования для этого номера
-            active_bookings = self.instance.bookings.filter(
-                status='active',
-                is_deleted=False
-            )
-            if active_bookings.exists():
+            # Номер занят, пока идёт активное бронирование (то же правило, что у room_status)
+            if room_status.current(self.instance.bookings.all()).exists():
                 raise serializers.ValidationError(
-                    "Номер забронирован. Сначала отмените или завершите бронирование."
+                    "Номер занят. Сначала отмените или завершите текущее бронирование."
                 )
         return value
     
@@ -82,30 +120,33 @@ class RoomSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Room
+        list_serializer_class = RoomListSerializer
         fields = [
             'id', 'building', 'building_id', 'number', 'capacity', 'room_type', 'room_class', 'room_class_display', 'status', 'description',
             'is_active', 'price_per_night', 'rooms_count', 'amenities', 'is_deleted'
         ]
         read_only_fields = ['is_deleted']
+        expandable = {'building': 'building_id'}
+        sparse_requires = {'building': ('building__name',), 'room_class_display': ('room_class',)}
+        fast_fields = {
+            'building': (('building_id', 'building__name'), building_ref),
+            'room_class_display': (('room_class',), room_class_ref),
+        }
 
-class GuestSerializer(serializers.ModelSerializer):
-    total_spent = serializers.SerializerMethodField()
-    
+class RoomBulkUpdateSerializer(serializers.Serializer):
+    """Частичное изменение одного номера в PATCH /api/rooms/bulk/"""
+    id = serializers.IntegerField()
+    price_per_night = serializers.DecimalField(max_digits=8, decimal_places=2, required=False, min_value=0)
+    status = serializers.ChoiceField(choices=Room._meta.get_field('status').choices, required=False)
+    room_class = serializers.ChoiceField(choices=Room._meta.get_field('room_class').choices, required=False)
+    amenities = serializers.CharField(max_length=255, required=False, allow_blank=True)
+
+class GuestSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Guest
         fields = '__all__'
-        read_only_fields = ['is_deleted']
-    
-    def get_total_spent(self, obj):
-        """Вычисляет общую сумму оплаченных бронирований гостя"""
-        from decimal import Decimal
-        total = obj.bookings.filter(
-            payment_status='paid',
-            is_deleted=False
-        ).aggregate(
-            total=Sum('total_amount')
-        )['total'] or Decimal('0')
-        return str(total)
+        # total_spent и visits_count ведутся автоматически по бронированиям (guest_stats)
+        read_only_fields = ['is_deleted', 'total_spent', 'visits_count']
 
     def validate_full_name(self, value):
         """Валидация ФИО"""
@@ -173,25 +214,73 @@ class GuestSerializer(serializers.ModelSerializer):
             logger.error(f"Error updating guest {instance.id}: {str(e)}")
             raise serializers.ValidationError(f"Ошибка при обновлении гостя: {str(e)}")
 
-class BookingSerializer(serializers.ModelSerializer):
+class BookingRoomSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """Краткое представление номера внутри бронирования"""
+    building = serializers.SerializerMethodField()
+    room_class = serializers.SerializerMethodField()
+    # Цена отдаётся числом, как раньше
+    price_per_night = serializers.DecimalField(max_digits=8, decimal_places=2, coerce_to_string=False)
+
+    def get_building(self, obj):
+        return {'id': obj.building.id, 'name': obj.building.name}
+
+    def get_room_class(self, obj):
+        return {'value': obj.room_class, 'label': obj.get_room_class_display()}
+
+    class Meta:
+        model = Room
+        fields = ['id', 'number', 'building', 'room_class', 'capacity', 'room_type', 'status', 'price_per_night']
+        sparse_requires = {'building': ('building__name',), 'room_class': ('room_class',)}
+        fast_fields = {
+            'building': (('building_id', 'building__name'), building_ref),
+            'room_class': (('room_class',), room_class_ref),
+        }
+
+class BookingSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     guest = GuestSerializer(read_only=True)
     guest_id = serializers.PrimaryKeyRelatedField(queryset=Guest.objects.all(), source='guest', write_only=True)
-    room = serializers.SerializerMethodField()
-    room_id = serializers.PrimaryKeyRelatedField(queryset=Room.objects.all(), source='room', write_only=True)
-    
-    def get_room(self, obj):
-        r = obj.room
-        return {
-            'id': r.id,
-            'number': r.number,
-            'building': {'id': r.building.id, 'name': r.building.name},
-            'room_class': {'value': r.room_class, 'label': r.get_room_class_display()},
-            'capacity': r.capacity,
-            'room_type': r.room_type,
-            'status': r.status,
-            'price_per_night': r.price_per_night,
-        }
+    room = BookingRoomSerializer(read_only=True)
+    # building подгружается сразу: он нужен для суммы, статуса номера и записи в журнал
+    room_id = serializers.PrimaryKeyRelatedField(queryset=Room.objects.select_related('building'), source='room', write_only=True)
     
+    def find_conflict(self, room, check_in, check_out):
+        """Возвращает id активного бронирования, пересекающегося с интервалом, или None"""
+        conflicts = Booking.objects.filter(
+            room=room,
+            status='active',
+            is_deleted=False,
+            check_in__lt=check_out,
+            check_out__gt=check_in
+        )
+        if self.instance:
+            conflicts = conflicts.exclude(id=self.instance.id)
+        return conflicts.values_list('id', flat=True).first()
+
+    def _save_checked(self, save, *args):
+        """Сохраняет бронирование, превращая нарушение ограничения пересечения в ошибку валидации"""
+        try:
+            with transaction.atomic():
+                return save(*args)
+        except IntegrityError as e:
+            if BOOKING_OVERLAP_CONSTRAINT not in str(e):
+                raise
+            data = self.validated_data
+            room = data.get('room') or self.instance.room
+            conflict_id = self.find_conflict(
+                room,
+                data.get('check_in') or self.instance.check_in,
+                data.get('check_out') or self.instance.check_out
+            )
+            raise serializers.ValidationError(
+                f"Номер уже забронирован на эти даты (бронирование #{conflict_id})"
+            )
+
+    def create(self, validated_data):
+        return self._save_checked(super().create, validated_data)
+
+    def update(self, instance, validated_data):
+        return self._save_checked(super().update, instance, validated_data)
+
     def validate(self, data):
         """Валидация данных бронирования"""
         check_in = data.get('check_in')
@@ -224,20 +313,19 @@ class BookingSerializer(serializers.ModelSerializer):
                     "Количество гостей должно быть больше 0"
                 )
         
-        # Проверка доступности номера
-        if check_in and check_out and room:
-            conflicting_bookings = Booking.objects.filter(
-                room=room,
-                status='active',
-                is_deleted=False
-            ).exclude(id=self.instance.id if self.instance else None)
-            
-            # Проверяем пересечение дат
-            for booking in conflicting_bookings:
-                if (check_in < booking.check_out and check_out > booking.check_in):
-                    raise serializers.ValidationError(
-                        f"Номер уже забронирован на эти даты (бронирование #{booking.id})"
-                    )
+        # Проверка доступности номера: один запрос на пересечение интервалов по индексу.
+        # При частичном обновлении недостающие значения берём из текущего бронирования
+        if self.instance:
+            check_in = check_in or self.instance.check_in
+            check_out = check_out or self.instance.check_out
+            room = room or self.instance.room
+        booking_status = data.get('status') or (self.instance.status if self.instance else 'active')
+        if check_in and check_out and room and booking_status == 'active':
+            conflict_id = self.find_conflict(room, check_in, check_out)
+            if conflict_id:
+                raise serializers.ValidationError(
+                    f"Номер уже забронирован на эти даты (бронирование #{conflict_id})"
+                )
         
         return data
     
@@ -250,8 +338,48 @@ class BookingSerializer(serializers.ModelSerializer):
             'created_by', 'created_at', 'is_deleted'
         ]
         read_only_fields = ['created_by', 'created_at', 'is_deleted']
+        expandable = {'guest': 'guest_id', 'room': 'room_id'}
 
-class AuditLogSerializer(serializers.ModelSerializer):
+class AuditLogSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = AuditLog
-        fields = '__all__' 
\ No newline at end of file
+        fields = '__all__'
+
+class BookingImportRowSerializer(serializers.Serializer):
+    """
+    Строка массового импорта бронирований (без обращений к БД).
+    Гость задаётся через guest_id или полями full_name/phone/inn/email.
+    Один экземпляр проверяет все строки через run_validation().
+    """
+    guest_id = serializers.IntegerField(required=False, allow_null=True)
+    full_name = serializers.CharField(required=False, allow_blank=True, max_length=100)
+    phone = serializers.CharField(required=False, allow_blank=True, max_length=20)
+    inn = serializers.CharField(required=False, allow_blank=True, max_length=20)
+    email = serializers.EmailField(required=False, allow_blank=True)
+    room_id = serializers.IntegerField()
+    check_in = serializers.DateTimeField()
+    check_out = serializers.DateTimeField()
+    people_count = serializers.IntegerField(min_value=1, max_value=10)
+    payment_status = serializers.ChoiceField(choices=Booking._meta.get_field('payment_status').choices, default='pending')
+    payment_method = serializers.ChoiceField(choices=Booking._meta.get_field('payment_method').choices, default='cash')
+    payment_amount = serializers.DecimalField(max_digits=10, decimal_places=2, default=0)
+    comments = serializers.CharField(required=False, allow_blank=True, default='')
+
+    def validate(self, data):
+        from django.utils import timezone
+        if data['check_in'] >= data['check_out']:
+            raise serializers.ValidationError("Дата выезда должна быть позже даты заезда")
+        if data['check_in'] < timezone.now():
+            raise serializers.ValidationError("Дата заезда не может быть в прошлом")
+        if not data.get('guest_id'):
+            # Один экземпляр GuestSerializer на весь импорт: поля ModelSerializer строятся один раз
+            if not hasattr(self, '_guest_serializer'):
+                self._guest_serializer = GuestSerializer()
+            data['guest'] = self._guest_serializer.run_validation({
+                'full_name': data.get('full_name', ''),
+                'phone': data.get('phone', ''),
+                'inn': data.get('inn', ''),
+                'email': data.get('email', ''),
+                'people_count': data['people_count'],
+            })
+        return data
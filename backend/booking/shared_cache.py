@@ -0,0 +1,15 @@
+"""
+Проверка, общий ли кэш Django для процессов.
+
+LocMemCache (кэш по умолчанию) и DummyCache живут внутри процесса: значения,
+записанные одним воркером, не видят другие воркеры и управляющие команды.
+Модули, которым нужен общий кэш (Redis, Memcached, БД), проверяют is_shared()
+и без него работают в пределах процесса.
+"""
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def is_shared(alias='default'):
+    return not isinstance(caches[alias], (LocMemCache, DummyCache))
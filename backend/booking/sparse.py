@@ -0,0 +1,136 @@
+"""
+Выборочные поля ответа: ?fields= и ?expand=.
+
+?fields=id,check_in,guest.full_name - только перечисленные поля; поля вложенных
+объектов задаются через точку. ?expand=guest,room - вложенные объекты целиком.
+Если передан хотя бы один из параметров, связи из Meta.expandable, которые не
+раскрыты, отдаются как id. Без параметров ответ не меняется.
+
+SparseQuerysetMixin подстраивает queryset viewset'а под запрошенные поля:
+select_related только для раскрытых связей и only() для нужных колонок.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+
+def _param(request, name):
+    return [item.strip() for item in request.query_params.get(name, '').split(',') if item.strip()]
+
+
+def is_sparse(request):
+    """Запрошен ли выборочный ответ (только для чтения)"""
+    return (
+        request is not None
+        and request.method in ('GET', 'HEAD')
+        and bool(request.query_params.get('fields') or request.query_params.get('expand'))
+    )
+
+
+def _path(serializer):
+    """Путь сериализатора от корня: '' для корня, 'guest' для вложенного гостя"""
+    names = []
+    node = serializer
+    while node.parent is not None:
+        if node.field_name:
+            names.append(node.field_name)
+        node = node.parent
+    return '.'.join(reversed(names))
+
+
+class SparseFieldsMixin:
+    """
+    Сериализатор с поддержкой ?fields= и ?expand=.
+    Meta.expandable - связи, которые без раскрытия заменяются на id ({'guest': 'guest_id'}).
+    Meta.sparse_requires - колонки для полей без прямого source ({'building': ('building__name',)}).
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if not is_sparse(request):
+            return fields
+
+        prefix = _path(self)
+        prefix = f'{prefix}.' if prefix else ''
+        requested = [f[len(prefix):] for f in _param(request, 'fields') if f.startswith(prefix)]
+        expand = {f[len(prefix):] for f in _param(request, 'expand') if f.startswith(prefix)}
+        own = {f.split('.', 1)[0] for f in requested}
+        # Связь раскрыта, если она в expand или запрошены её поля через точку
+        expand = {f.split('.', 1)[0] for f in expand} | {f.split('.', 1)[0] for f in requested if '.' in f}
+        expandable = getattr(self.Meta, 'expandable', {})
+
+        for name, field in list(fields.items()):
+            if field.write_only:
+                continue
+            if own and name not in own and name not in expand:
+                del fields[name]
+            elif name in expandable and name not in expand:
+                fields[name] = serializers.ReadOnlyField(source=expandable[name])
+        return fields
+
+
+def _requirements(serializer, prefix=''):
+    """
+    Колонки (для only) и связи (для select_related), нужные полям сериализатора.
+    Для only возвращает None, если какое-то поле нельзя сопоставить с колонкой.
+    """
+    model = serializer.Meta.model
+    requires = getattr(serializer.Meta, 'sparse_requires', {})
+    only, related = {model._meta.pk.name}, set()
+
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if isinstance(field, serializers.BaseSerializer):
+            nested_only, nested_related = _requirements(field, f'{prefix}{field.source}__')
+            related.add(f'{prefix}{field.source}')
+            related |= nested_related
+            if only is not None:
+                only.add(field.source)
+            if nested_only is None:
+                only = None
+            elif only is not None:
+                only |= {f'{field.source}__{path}' for path in nested_only}
+            continue
+        if field.source == '*':
+            # SerializerMethodField и подобные: колонки берём из Meta.sparse_requires
+            paths = requires.get(name, ('*',))
+        else:
+            paths = (field.source.replace('.', '__'),)
+        for path in paths:
+            parts = path.split('__')
+            try:
+                model_field = model._meta.get_field(parts[0])
+            except FieldDoesNotExist:
+                only = None
+                break
+            if not model_field.concrete:
+                only = None
+                break
+            if len(parts) > 1:
+                related.add(f'{prefix}{parts[0]}')
+            if only is not None:
+                only.add(model_field.name)
+                if len(parts) > 1:
+                    only.add(path)
+    return only, related
+
+
+class SparseQuerysetMixin:
+    """Viewset: при ?fields=/?expand= загружает только нужные колонки и связи"""
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve') or not is_sparse(self.request):
+            return queryset
+        only, related = _requirements(self.get_serializer())
+        queryset = queryset.select_related(None)
+        if related:
+            queryset = queryset.select_related(*sorted(related))
+        if only is not None:
+            # Поля курсорной пагинации тоже должны быть загружены
+            ordering = getattr(self, 'cursor_ordering', ())
+            ordering = (ordering,) if isinstance(ordering, str) else ordering
+            only |= {field.lstrip('-') for field in ordering}
+            queryset = queryset.only(*sorted(only))
+        return queryset
@@ -1,7 +1,7 @@
 from django.shortcuts import render
 from rest_framework import viewsets, permissions
 from .models import Building, Room, Guest, Booking, AuditLog, User
-from .serializers import BuildingSerializer, RoomSerializer, GuestSerializer, BookingSerializer, AuditLogSerializer, UserSerializer
+from .serializers import BuildingSerializer, RoomSerializer, GuestSerializer, BookingSerializer, AuditLogSerializer, UserSerializer, RoomBulkUpdateSerializer
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -11,16 +11,24 @@ import logging
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from rest_framework.views import APIView
+from rest_framework.exceptions import APIException, ValidationError
+from django.db import transaction
 from rest_framework.decorators import api_view, permission_classes
 from django.shortcuts import get_object_or_404
 from django.contrib.auth import authenticate
-from rest_framework_simplejwt.tokens import RefreshToken
-from django.contrib.auth.hashers import check_password
-from django.utils import timezone
+from . import audit, events, presence, response_cache, room_status
+from .authentication import ClaimsTokenRefreshSerializer, events_ticket, events_ticket_lifetime, tokens_for
+from .response_cache import CachedListMixin
+from .sparse import SparseQuerysetMixin
+from .fast_list import FastListMixin
+from .importer import import_bookings, parse_rows, ImportFormatError
+from .search import search_guests, SEARCH_DEFAULT_LIMIT
+from .reports import dashboard_summary, build_report, occupancy_calendar, available_rooms, ReportParamsError
 
 # Настройка логирования
 logger = logging.getLogger(__name__)
 
+
 # Create your views here.
 
 class CustomTokenObtainPairView(TokenObtainPairView):
@@ -50,8 +58,8 @@ class CustomTokenObtainPairView(TokenObtainPairView):
                     'error': 'Аккаунт заблокирован'
                 }, status=status.HTTP_401_UNAUTHORIZED)
             
-            # Проверяем пароль
-            if not check_password(password, user.password):
+            # Проверяем пароль (user.check_password заодно обновляет устаревший хеш)
+            if not user.check_password(password):
                 return Response({
                     'error': 'Неверный логин или пароль'
                 }, status=status.HTTP_401_UNAUTHORIZED)
@@ -62,12 +70,11 @@ class CustomTokenObtainPairView(TokenObtainPairView):
                     'error': 'Недостаточно прав доступа'
                 }, status=status.HTTP_403_FORBIDDEN)
             
-            # Обновляем last_seen
-            user.last_seen = timezone.now()
-            user.save(update_fields=['last_seen'])
+            # Отмечаем активность через кэш присутствия, last_seen в БД перенесёт фоновый поток (presence.py)
+            presence.touch(user)
             
-            # Генерируем токены
-            refresh = RefreshToken.for_user(user)
+            # Генерируем токены с claims role, is_staff и username (см. booking/authentication.py)
+            refresh = tokens_for(user)
             
             return Response({
                 'access': str(refresh.access_token),
@@ -89,10 +96,18 @@ class CustomTokenObtainPairView(TokenObtainPairView):
                 'error': 'Ошибка сервера'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-class UserViewSet(viewsets.ModelViewSet):
+class ClaimsTokenRefreshView(TokenRefreshView):
+    """Обновление access-токена с актуальными claims сотрудника"""
+    serializer_class = ClaimsTokenRefreshSerializer
+
+class UserViewSet(SparseQuerysetMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAdminUser]
+    cursor_ordering = 'id'
+    # Фронтенд (users/page.tsx) читает список массивом
+    paginate_by_default = False
+    query_filters = {'role': 'role', 'is_active': 'is_active'}
 
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def me(self, request):
@@ -103,31 +118,116 @@ class UserViewSet(viewsets.ModelViewSet):
             logger.error(f"Error in UserViewSet.me: {str(e)}")
             return Response({'error': 'Internal server error'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-class BuildingViewSet(viewsets.ModelViewSet):
+class BuildingViewSet(CachedListMixin, SparseQuerysetMixin, viewsets.ModelViewSet):
     queryset = Building.objects.all()
     serializer_class = BuildingSerializer
     permission_classes = [permissions.IsAuthenticated]
+    # Фронтенд (buildings, rooms) читает список массивом
+    paginate_by_default = False
+    cursor_ordering = 'id'
+    cache_namespace = 'buildings'
 
-class RoomViewSet(viewsets.ModelViewSet):
-    queryset = Room.objects.filter(is_deleted=False)
+class RoomViewSet(CachedListMixin, FastListMixin, SparseQuerysetMixin, viewsets.ModelViewSet):
+    queryset = Room.objects.filter(is_deleted=False).select_related('building')
     serializer_class = RoomSerializer
     permission_classes = [permissions.IsAuthenticated]
+    # Фронтенд (rooms, buildings, bookings, dashboard) читает список массивом
+    paginate_by_default = False
+    cursor_ordering = 'id'
+    cache_namespace = 'rooms'
+    query_filters = {
+        'building': 'building_id',
+        'building_id': 'building_id',
+        'status': 'status',
+        'room_class': 'room_class',
+        'is_active': 'is_active',
+        'capacity_min': 'capacity__gte',
+    }
 
     def create(self, request, *args, **kwargs):
         try:
-            rooms_data = request.data.get('rooms')
+            rooms_data = request.data.get('rooms') if isinstance(request.data, dict) else None
             if rooms_data:
-                # bulk create через DRF
-                serializer = self.get_serializer(data=rooms_data, many=True)
+                # Массовое создание: корпуса загружаются одним запросом, номера - одним bulk_create
+                building_ids = {item.get('building_id') for item in rooms_data if isinstance(item, dict)}
+                context = self.get_serializer_context()
+                context['buildings'] = Building.objects.in_bulk(
+                    [int(pk) for pk in building_ids if str(pk).isdigit()]
+                )
+                serializer = self.get_serializer_class()(data=rooms_data, many=True, context=context)
                 serializer.is_valid(raise_exception=True)
-                serializer.save()  # DRF корректно обработает many=True
+                with transaction.atomic():
+                    serializer.save()
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             else:
                 return super().create(request, *args, **kwargs)
+        except ValidationError:
+            raise
         except Exception as e:
             logger.error(f"Error in RoomViewSet.create: {str(e)}")
             return Response({'error': 'Internal server error'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=False, methods=['patch'])
+    def bulk(self, request):
+        """
+        Массовое изменение номеров: список [{"id": 1, "price_per_night": ...}, ...]
+        или {"ids": [...], "changes": {...}}. Поля: price_per_night, status, room_class, amenities.
+        """
+        data = request.data
+        if isinstance(data, dict) and 'ids' in data:
+            changes = data.get('changes') or {}
+            if not isinstance(changes, dict) or not isinstance(data['ids'], list):
+                return Response({'error': 'Ожидаются ids (список) и changes (объект)'}, status=status.HTTP_400_BAD_REQUEST)
+            data = [{**changes, 'id': room_id} for room_id in data['ids']]
+        elif isinstance(data, dict):
+            data = data.get('rooms')
+        if not isinstance(data, list) or not data:
+            return Response({'error': 'Нет номеров для изменения'}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = RoomBulkUpdateSerializer(data=data, many=True)
+        serializer.is_valid(raise_exception=True)
+        updates = {item['id']: item for item in serializer.validated_data}
+
+        rooms = Room.objects.filter(is_deleted=False).select_related('building').in_bulk(updates.keys())
+        missing = sorted(set(updates) - set(rooms))
+        if missing:
+            return Response({'error': f'Номера не найдены: {missing}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Нельзя освободить номер с текущим бронированием (одна проверка на все номера, правило room_status)
+        freeing = [room_id for room_id, item in updates.items() if item.get('status') == 'free']
+        booked = sorted(room_status.current(Booking.objects.filter(
+            room_id__in=freeing
+        )).values_list('room_id', flat=True).distinct()) if freeing else []
+        if booked:
+            return Response({
+                'error': f'Номера заняты, сначала отмените или завершите текущие бронирования: {booked}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        fields = set()
+        for room_id, item in updates.items():
+            room = rooms[room_id]
+            for field, value in item.items():
+                if field != 'id':
+                    setattr(room, field, value)
+                    fields.add(field)
+        if fields:
+            with transaction.atomic():
+                Room.objects.bulk_update(rooms.values(), sorted(fields), batch_size=500)
+                for room in rooms.values():
+                    audit.log(
+                        user=request.user,
+                        action='Изменение',
+                        object_type='Room',
+                        object_id=room.id,
+                        details=f'Комната: {room.building} {room.number}, вместимость: {room.capacity}, тип: {room.room_type}, статус: {room.status}'
+                    )
+                    # bulk_update не вызывает сигналы
+                    if 'status' in fields:
+                        events.publish_room_status(room.id, room.building_id, room.status)
+                response_cache.invalidate('rooms')
+
+        return Response(RoomSerializer(rooms.values(), many=True, context=self.get_serializer_context()).data)
+
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
         instance.soft_delete()
@@ -138,19 +238,59 @@ class RoomViewSet(viewsets.ModelViewSet):
         instance.restore()
         return Response({'success': True})
 
-class GuestViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def available(self, request):
+        """Свободные номера на период: check_in, check_out, people, building, room_class, ordering"""
+        try:
+            rooms = available_rooms(request.query_params)
+        except ReportParamsError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = self.get_serializer(rooms.select_related('building'), many=True)
+        return Response(serializer.data)
+
+class GuestViewSet(FastListMixin, SparseQuerysetMixin, viewsets.ModelViewSet):
     queryset = Guest.objects.filter(is_deleted=False)
     serializer_class = GuestSerializer
     permission_classes = [permissions.IsAuthenticated]
+    # Фронтенд (bookings, dashboard) читает список массивом
+    paginate_by_default = False
+    query_filters = {
+        'status': 'status',
+        'registered_from': 'registration_date__gte',
+        'registered_to': 'registration_date__lte',
+    }
+
+    @property
+    def cursor_ordering(self):
+        """?ordering=-total_spent - гости по сумме оплат (индекс guest_total_spent_idx)"""
+        if self.request and self.request.query_params.get('ordering') == '-total_spent':
+            return ('-total_spent', '-id')
+        return ('-id',)
+
+    def get_queryset(self):
+        # Порядок нужен и без пагинации (список без ?cursor=/?page_size=)
+        return super().get_queryset().order_by(*self.cursor_ordering)
 
     def list(self, request, *args, **kwargs):
         try:
             logger.info(f"GuestViewSet.list called by user: {request.user}")
             return super().list(request, *args, **kwargs)
+        except APIException:
+            # Ошибки фильтров и пагинации (400/404) отдаются как есть
+            raise
         except Exception as e:
             logger.error(f"Error in GuestViewSet.list: {str(e)}")
             return Response({'error': 'Internal server error'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Автодополнение гостей: /api/guests/search/?q=&limit= (ФИО, телефон, ИНН)"""
+        try:
+            limit = int(request.query_params.get('limit', SEARCH_DEFAULT_LIMIT))
+        except ValueError:
+            return Response({'error': 'Параметр limit должен быть числом'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(search_guests(request.query_params.get('q', ''), limit))
+
     def create(self, request, *args, **kwargs):
         try:
             logger.info(f"GuestViewSet.create called by user: {request.user} with data: {request.data}")
@@ -249,7 +389,7 @@ class GuestViewSet(viewsets.ModelViewSet):
                 )
             
             # Создаем запись в логе
-            AuditLog.objects.create(
+            audit.log(
                 user=request.user,
                 action='Отправка сообщения',
                 object_type='Guest',
@@ -269,18 +409,35 @@ class GuestViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-class BookingViewSet(viewsets.ModelViewSet):
-    queryset = Booking.objects.filter(is_deleted=False)
+class BookingViewSet(FastListMixin, SparseQuerysetMixin, viewsets.ModelViewSet):
+    queryset = Booking.objects.filter(is_deleted=False).select_related('guest', 'room__building')
     serializer_class = BookingSerializer
     permission_classes = [permissions.IsAuthenticated]
+    # Фронтенд (bookings, dashboard, reports) читает список массивом
+    paginate_by_default = False
+    cursor_ordering = ('-check_in', '-id')
+    # date_from/date_to отбирают бронирования, пересекающиеся с периодом
+    query_filters = {
+        'status': 'status',
+        'payment_status': 'payment_status',
+        'building': 'room__building_id',
+        'room': 'room_id',
+        'guest': 'guest_id',
+        'date_from': 'check_out__date__gte',
+        'date_to': 'check_in__date__lte',
+    }
 
     def perform_create(self, serializer):
         booking = serializer.save(created_by=self.request.user)
+        # Счётчики гостя обновлены через F(), в ответе нужны актуальные значения
+        booking.guest.refresh_from_db(fields=['total_spent', 'visits_count'])
         logger.info(f"Создано новое бронирование: {booking.guest.full_name} в {booking.room}")
         # Здесь можно добавить уведомление о новом бронировании
 
     def perform_update(self, serializer):
         booking = serializer.save()
+        # Счётчики гостя обновлены через F(), в ответе нужны актуальные значения
+        booking.guest.refresh_from_db(fields=['total_spent', 'visits_count'])
         logger.info(f"Обновлено бронирование: {booking.guest.full_name} в {booking.room}")
         # Здесь можно добавить уведомление об обновлении
 
@@ -300,10 +457,89 @@ class BookingViewSet(viewsets.ModelViewSet):
         instance.restore()
         return Response({'success': True})
 
-class AuditLogViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_bookings(self, request):
+        """
+        Массовый импорт бронирований: JSON-список строк, CSV в теле (text/csv)
+        или файл .csv/.json в поле file. ?partial=1 - сохранить корректные строки,
+        ?dry_run=1 - только проверить.
+        """
+        try:
+            upload = request.FILES.get('file') if request.content_type.startswith('multipart/') else None
+            if upload is not None:
+                fmt = 'csv' if upload.name.lower().endswith('.csv') else 'json'
+                rows = parse_rows(upload.read(), fmt)
+            elif request.content_type.startswith('text/csv'):
+                rows = parse_rows(request.body, 'csv')
+            else:
+                rows = request.data
+                if isinstance(rows, dict):
+                    rows = rows.get('rows')
+                if not isinstance(rows, list):
+                    raise ImportFormatError("Ожидается список строк или объект с ключом rows")
+        except ImportFormatError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        report = import_bookings(
+            rows,
+            user=request.user,
+            partial=request.query_params.get('partial') == '1',
+            dry_run=request.query_params.get('dry_run') == '1',
+        )
+        logger.info(f"Импорт бронирований: создано {report['created']}, ошибок {len(report['errors'])}")
+        if report['created']:
+            return Response(report, status=status.HTTP_201_CREATED)
+        if report['errors']:
+            return Response(report, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report)
+
+class AuditLogViewSet(FastListMixin, SparseQuerysetMixin, viewsets.ModelViewSet):
     queryset = AuditLog.objects.all().order_by('-timestamp')
     serializer_class = AuditLogSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = ('-timestamp', '-id')
+    query_filters = {
+        'user': 'user_id',
+        'action': 'action',
+        'object_type': 'object_type',
+        'object_id': 'object_id',
+        'date_from': 'timestamp__date__gte',
+        'date_to': 'timestamp__date__lte',
+    }
+
+class DashboardSummaryView(APIView):
+    """Сводка для главной страницы: номера, бронирования, гости и выручка за сегодня"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        return Response(dashboard_summary())
+
+class ReportsView(APIView):
+    """Отчёт по выручке, оплатам, ночам и загрузке за период"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        try:
+            return Response(build_report(request.query_params))
+        except ReportParamsError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+class CalendarView(APIView):
+    """Шахматка бронирований для календаря: ?from=&to=&building="""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        try:
+            return Response(occupancy_calendar(request.query_params))
+        except ReportParamsError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+class EventsTicketView(APIView):
+    """Билет для подключения к /api/events/?ticket= (EventSource не умеет передавать заголовок с токеном)"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        return Response({'ticket': events_ticket(request.user), 'expires_in': events_ticket_lifetime()})
 
 class TrashViewSet(APIView):
     permission_classes = [permissions.IsAdminUser]
@@ -314,11 +550,11 @@ class TrashViewSet(APIView):
             serializer = GuestSerializer(data, many=True)
             return Response(serializer.data)
         elif obj_type == 'rooms':
-            data = Room.objects.filter(is_deleted=True)
+            data = Room.objects.filter(is_deleted=True).select_related('building')
             serializer = RoomSerializer(data, many=True)
             return Response(serializer.data)
         elif obj_type == 'bookings':
-            data = Booking.objects.filter(is_deleted=True)
+            data = Booking.objects.filter(is_deleted=True).select_related('guest', 'room__building')
             serializer = BookingSerializer(data, many=True)
             return Response(serializer.data)
         return Response({'error': 'Invalid type'}, status=400)
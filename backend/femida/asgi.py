@@ -3,6 +3,27 @@ ASGI config for femida project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Запуск под uvicorn с async-эндпоинтами чтения на основных путях /api/:
+
+    ASYNC_READ_ENDPOINTS=1 uvicorn femida.asgi:application --host 0.0.0.0 --port 8000 --workers 4
+
+Без ASYNC_READ_ENDPOINTS async-варианты доступны только под /api/async/.
+Рядом с веб-процессом (один экземпляр на все воркеры) запускается пересчёт
+статусов номеров: номер становится занятым при заезде и освобождается при выезде,
+прошедшие бронирования завершаются (см. booking/room_status.py):
+
+    python manage.py update_room_statuses --every 300
+
+С несколькими воркерами нужен общий кэш, например
+CACHE_BACKEND=django.core.cache.backends.redis.RedisCache CACHE_LOCATION=redis://127.0.0.1:6379:
+с LocMemCache у каждого воркера свой кэш, поэтому кэш ответов справочников
+(ETag/304) выключен, а присутствие сотрудников видно только в своём воркере.
+Поток изменений /api/events/ под ASGI не занимает поток на клиента; с несколькими
+воркерами нужен EVENTS_BROKER=booking.events.PostgresBroker.
+Middleware проекта работают в async-цепочке без перехода в поток, синхронные
+представления DRF Django выполняет в потоке. Статику отдаёт nginx или
+collectstatic + отдельный сервер: ASGI-приложение её не обслуживает.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
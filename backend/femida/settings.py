@@ -47,6 +47,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'booking.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -56,6 +57,7 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'booking.middleware.UserActivityMiddleware',
+    'booking.middleware.AuditBufferMiddleware',
     'booking.middleware.ErrorHandlingMiddleware',
 ]
 
@@ -163,13 +165,81 @@ AUTH_USER_MODEL = 'booking.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'booking.authentication.TokenUserAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_PAGINATION_CLASS': 'booking.pagination.FemidaCursorPagination',
+    'DEFAULT_FILTER_BACKENDS': [
+        'booking.filters.QueryParamFilterBackend',
+    ],
+}
+
+# LocMemCache у каждого процесса свой (booking/shared_cache.py). Для нескольких воркеров
+# (uvicorn --workers, gunicorn) нужен общий кэш, например
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache, CACHE_LOCATION=redis://127.0.0.1:6379.
+# С кэшем процесса:
+# - присутствие сотрудников (booking/presence.py) видно только в своём процессе;
+# - кэш ответов справочников (booking/response_cache.py) выключен, см. RESPONSE_CACHE_PER_PROCESS.
+# JWT-аутентификации (booking/authentication.py) общий кэш не нужен.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'femida'),
+    }
 }
 
+# Число попыток записи журнала действий после коммита (см. booking/audit.py)
+AUDIT_LOG_RETRIES = int(os.environ.get('AUDIT_LOG_RETRIES', '3'))
+
+# Время жизни кэша ответов справочников, секунд (см. booking/response_cache.py)
+RESPONSE_CACHE_TIMEOUT = 300
+# Кэш ответов работает только с общим кэшем; с кэшем процесса его можно включить
+# лишь для одного процесса (runserver, один воркер), иначе воркеры отдают устаревшие списки и 304
+RESPONSE_CACHE_PER_PROCESS = os.environ.get('RESPONSE_CACHE_PER_PROCESS', '') == '1'
+
+# Активность сотрудников пишется в кэш не чаще раза в N секунд (см. booking/presence.py)
+USER_PRESENCE_INTERVAL = 60
+# Раз в N секунд веб-процесс переносит активность из кэша в User.last_seen; 0 - только команда flush_presence
+USER_PRESENCE_FLUSH_INTERVAL = int(os.environ.get('USER_PRESENCE_FLUSH_INTERVAL', '300'))
+
+# Замеры запросов и заголовок Server-Timing (см. booking/middleware.py, PerformanceMiddleware)
+PERFORMANCE_MONITORING = True
+# Доля запросов с подробным замером SQL (0..1); для отладки - 1
+PERFORMANCE_SAMPLE_RATE = float(os.environ.get('PERFORMANCE_SAMPLE_RATE', '0.05'))
+# Запрос медленнее этого порога (мс) пишется в лог booking.performance
+PERFORMANCE_SLOW_REQUEST_MS = int(os.environ.get('PERFORMANCE_SLOW_REQUEST_MS', '500'))
+# Столько повторов одного SQL за запрос считается N+1 и тоже пишется в лог
+PERFORMANCE_REPEATED_QUERIES = 10
+PERFORMANCE_SLOW_QUERIES = 5
+# Кому отдавать заголовок Server-Timing: 'staff' (is_staff), 'all' или 'off'
+PERFORMANCE_SERVER_TIMING = os.environ.get('PERFORMANCE_SERVER_TIMING', 'staff')
+
+# Сколько секунд кэшируются поля сотрудника вне claims JWT (см. booking/authentication.py)
+JWT_USER_CACHE_TTL = int(os.environ.get('JWT_USER_CACHE_TTL', '60'))
+# Раз в N секунд процесс сверяет снимок сотрудников с БД: через столько блокировка
+# и смена прав в другом процессе доходят до claims выданных токенов
+JWT_USER_CHECK_INTERVAL = int(os.environ.get('JWT_USER_CHECK_INTERVAL', '5'))
+
+# Основные пути /api/ сводки, шахматки, свободных номеров и списков обслуживаются
+# async-представлениями (booking/async_views.py); имеет смысл под ASGI, см. femida/asgi.py
+ASYNC_READ_ENDPOINTS = os.environ.get('ASYNC_READ_ENDPOINTS', '') == '1'
+
+# Поток изменений /api/events/ (см. booking/events.py). Для нескольких процессов
+# нужен booking.events.PostgresBroker: InProcessBroker видит события только своего процесса
+EVENTS_BROKER = os.environ.get('EVENTS_BROKER', 'booking.events.InProcessBroker')
+# Сколько последних событий хранится для переподключения с Last-Event-ID
+EVENTS_HISTORY = 1000
+# Пустая строка-комментарий раз в N секунд, чтобы прокси не закрывали соединение
+EVENTS_HEARTBEAT = 15
+# Поток закрывается через N секунд, клиент переподключается с Last-Event-ID
+EVENTS_STREAM_TIMEOUT = int(os.environ.get('EVENTS_STREAM_TIMEOUT', '300'))
+# Поток событий под WSGI занимает поток сервера на всё подключение: только для runserver
+EVENTS_WSGI_STREAM = os.environ.get('EVENTS_WSGI_STREAM', '') == '1'
+# Сколько секунд действует билет на подключение к потоку событий (POST /api/events/ticket/)
+EVENTS_TICKET_LIFETIME = 60
+
 from datetime import timedelta
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=2),
@@ -267,6 +337,10 @@ else:
                 'level': 'ERROR',
                 'class': 'logging.StreamHandler',
             },
+            'performance': {
+                'level': 'WARNING',
+                'class': 'logging.StreamHandler',
+            },
         },
         'loggers': {
             'django': {
@@ -274,5 +348,10 @@ else:
                 'level': 'ERROR',
                 'propagate': False,
             },
+            'booking.performance': {
+                'handlers': ['performance'],
+                'level': 'WARNING',
+                'propagate': False,
+            },
         },
     }
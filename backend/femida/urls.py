@@ -17,8 +17,8 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework import routers
-from booking.views import UserViewSet, RoomViewSet, GuestViewSet, BookingViewSet, BuildingViewSet, AuditLogViewSet, TrashViewSet, CustomTokenObtainPairView
-from rest_framework_simplejwt.views import TokenRefreshView
+from booking import async_views
+from booking.views import UserViewSet, RoomViewSet, GuestViewSet, BookingViewSet, BuildingViewSet, AuditLogViewSet, TrashViewSet, CustomTokenObtainPairView, ClaimsTokenRefreshView, DashboardSummaryView, ReportsView, CalendarView, EventsTicketView
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from rest_framework.permissions import AllowAny
@@ -43,12 +43,34 @@ router.register(r'bookings', BookingViewSet)
 router.register(r'buildings', BuildingViewSet)
 router.register(r'auditlog', AuditLogViewSet)
 
+# Async-варианты эндпоинтов чтения (booking/async_views.py) для запуска под ASGI
+async_urlpatterns = [
+    path('dashboard/summary/', async_views.dashboard_summary),
+    path('calendar/', async_views.calendar),
+    path('rooms/available/', async_views.rooms_available),
+    path('rooms/', async_views.rooms),
+    path('guests/', async_views.guests),
+    path('bookings/', async_views.bookings),
+]
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/async/', include(async_urlpatterns)),
+    path('api/events/', async_views.events_stream, name='events'),
+    path('api/events/ticket/', EventsTicketView.as_view(), name='events-ticket'),
+]
+if settings.ASYNC_READ_ENDPOINTS:
+    # Основные пути обслуживаются async-представлениями раньше роутера DRF
+    urlpatterns.append(path('api/', include(async_urlpatterns)))
+
+urlpatterns += [
     path('api/', include(router.urls)),
     path('api/auth/token/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('api/auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('api/auth/token/refresh/', ClaimsTokenRefreshView.as_view(), name='token_refresh'),
     path('api/docs/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
+    path('api/dashboard/summary/', DashboardSummaryView.as_view(), name='dashboard-summary'),
+    path('api/reports/', ReportsView.as_view(), name='reports'),
+    path('api/calendar/', CalendarView.as_view(), name='calendar'),
     path('api/trash/<str:obj_type>/', TrashViewSet.as_view()),
     path('api/trash/<str:action>/<str:obj_type>/<int:obj_id>/', TrashViewSet.as_view()),
 ]